@@ -0,0 +1,194 @@
+"""
+Replay recorded fixtures through the parse/extract helpers and report
+latency percentiles, allocations and peak RSS.
+
+    python bench/record.py                        # once, with network
+    python bench/bench_parse.py                   # run, print a table
+    python bench/bench_parse.py --json out.json   # save results
+    python bench/bench_parse.py --baseline out.json --max-regression 0.25
+
+With --baseline the run exits non-zero if any benchmark's p50 got slower
+than the baseline by more than --max-regression, so it can gate a deploy.
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Keep the NWS points cache out of the user's real cache directory
+os.environ.setdefault("PIDASH_CACHE_DIR", tempfile.mkdtemp(prefix="pidash-bench-"))
+
+from fixtures import load_payloads, replay_network, reset_caches
+
+from google.transit import gtfs_realtime_pb2
+
+from utils.feeds import L_FEED_URL, ALERTS_FEED_URL
+from utils.get_l_train_arrivals import fetch_arrivals
+from utils.get_l_train_alerts import fetch_l_train_alerts
+from utils.mta import get_mta_status
+from utils.weather import fetch_weather
+from utils.snapshot import LAT, LON, STOP_IDS
+from utils.stop_index import build_stop_index, build_stop_index_from_wire
+
+
+def _decode(content):
+    def run():
+        feed = gtfs_realtime_pb2.FeedMessage()
+        feed.ParseFromString(content)
+    return run
+
+
+def _index_protobuf(content):
+    # The pre-wire path: full ParseFromString, then walk the message objects
+    def run():
+        feed = gtfs_realtime_pb2.FeedMessage()
+        feed.ParseFromString(content)
+        build_stop_index(feed)
+    return run
+
+
+def _cold(fn):
+    # Drop every cache first so each call downloads, decodes and extracts
+    def run():
+        reset_caches()
+        fn()
+    return run
+
+
+def build_benchmarks(payloads):
+    benchmarks = {}
+    for url, (content, _) in payloads.items():
+        if url.split("/")[-1].startswith(("nyct", "camsys")):
+            name = url.rsplit('%2F', 1)[-1]
+            benchmarks[f"decode:{name}"] = _decode(content)
+            if "alerts" not in name:
+                benchmarks[f"index:{name}:protobuf"] = _index_protobuf(content)
+                benchmarks[f"index:{name}:wire"] = lambda content=content: build_stop_index_from_wire(content)
+                benchmarks[f"index:{name}:wire-stops"] = (
+                    lambda content=content: build_stop_index_from_wire(content, STOP_IDS)
+                )
+
+    if L_FEED_URL in payloads:
+        arrivals = lambda: fetch_arrivals(list(STOP_IDS))
+        status = lambda: get_mta_status(STOP_IDS[-1])
+        benchmarks["arrivals:cold"] = _cold(arrivals)
+        benchmarks["arrivals:warm"] = arrivals
+        benchmarks["mta_status:cold"] = _cold(status)
+        benchmarks["mta_status:warm"] = status
+    if ALERTS_FEED_URL in payloads:
+        benchmarks["alerts:cold"] = _cold(fetch_l_train_alerts)
+        benchmarks["alerts:warm"] = fetch_l_train_alerts
+    if any("api.weather.gov" in url for url in payloads):
+        weather = lambda: fetch_weather(LAT, LON)
+        benchmarks["weather:cold"] = _cold(weather)
+        benchmarks["weather:warm"] = weather
+    return benchmarks
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def run_benchmark(fn, iterations, warmup=3):
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    # Allocations are measured in a separate pass so tracing doesn't skew timings
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+
+    return {
+        "iterations": iterations,
+        "p50_ms": _percentile(samples, 50),
+        "p90_ms": _percentile(samples, 90),
+        "p99_ms": _percentile(samples, 99),
+        "max_ms": max(samples),
+        "mean_ms": statistics.fmean(samples),
+        "alloc_peak_kb": peak / 1024,
+        "alloc_blocks": blocks,
+    }
+
+
+def peak_rss_kb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return rss / 1024 if sys.platform == "darwin" else rss
+
+
+def print_table(results):
+    print(f"{'benchmark':<28}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'peak KB':>10}{'blocks':>10}")
+    for name, r in results["benchmarks"].items():
+        print(f"{name:<28}{r['p50_ms']:>10.2f}{r['p90_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+              f"{r['alloc_peak_kb']:>10.0f}{r['alloc_blocks']:>10}")
+    print(f"peak RSS: {results['peak_rss_kb']:,.0f} KB")
+
+
+def compare(results, baseline, max_regression):
+    """
+    Names of benchmarks whose p50 regressed beyond `max_regression`.
+    """
+    regressions = []
+    for name, r in results["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if base and r["p50_ms"] > base["p50_ms"] * (1 + max_regression):
+            regressions.append(f"{name}: {base['p50_ms']:.2f} -> {r['p50_ms']:.2f} ms")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--iterations", type=int, default=50)
+    parser.add_argument("-k", "--filter", default="", help="only run benchmarks containing this text")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    payloads = load_payloads()
+    if not payloads:
+        print("No fixtures found; run bench/record.py first.")
+        return 2
+
+    results = {"benchmarks": {}}
+    with replay_network(payloads):
+        for name, fn in build_benchmarks(payloads).items():
+            if args.filter in name:
+                results["benchmarks"][name] = run_benchmark(fn, args.iterations)
+    results["peak_rss_kb"] = peak_rss_kb()
+    print_table(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        for line in regressions:
+            print("REGRESSION", line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Recorded upstream payloads and a fake network that serves them.
+
+Fixtures live in bench/fixtures/ next to a manifest.json that maps each
+recorded URL to its file, so any helper can be replayed offline.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+PIDASH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PIDASH_DIR not in sys.path:
+    sys.path.insert(0, PIDASH_DIR)
+
+FIXTURES_DIR = os.path.join(PIDASH_DIR, "bench", "fixtures")
+MANIFEST = "manifest.json"
+
+
+def load_manifest(fixtures_dir=FIXTURES_DIR):
+    """
+    url -> {"file": ..., "content_type": ...}; empty if nothing was recorded.
+    """
+    try:
+        with open(os.path.join(fixtures_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_payloads(fixtures_dir=FIXTURES_DIR):
+    """
+    url -> (raw bytes, content type) for every recorded fixture.
+    """
+    payloads = {}
+    for url, entry in load_manifest(fixtures_dir).items():
+        with open(os.path.join(fixtures_dir, entry["file"]), "rb") as f:
+            payloads[url] = (f.read(), entry.get("content_type", ""))
+    return payloads
+
+
+class FakeResponse:
+    """
+    Just enough of requests.Response for the helpers in utils/.
+    """
+
+    def __init__(self, url, content, content_type="", status_code=200):
+        self.url = url
+        self.content = content
+        self.status_code = status_code
+        self.headers = {"Content-Type": content_type} if content_type else {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError(f"{self.status_code} for {self.url}", response=self)
+
+    def json(self):
+        return json.loads(self.content)
+
+
+@contextlib.contextmanager
+def replay_network(payloads):
+    """
+    Patch utils.http.get to answer from `payloads` instead of the network.
+    Unknown URLs get a 404 so missing fixtures show up as helper errors.
+    """
+    from utils import http
+
+    def fake_get(url, source=None, timeout=None, **kwargs):
+        if url not in payloads:
+            return FakeResponse(url, b"", status_code=404)
+        content, content_type = payloads[url]
+        return FakeResponse(url, content, content_type)
+
+    original = http.get
+    http.get = fake_get
+    try:
+        yield
+    finally:
+        http.get = original
+
+
+def _stub_key(url):
+    parts = urlsplit(url)
+    return parts.netloc + parts.path + (f"?{parts.query}" if parts.query else "")
+
+
+@contextlib.contextmanager
+def stub_upstreams(payloads, latency=0.0):
+    """
+    Serve `payloads` from a local HTTP server and point utils.http.get at it.
+
+    Unlike replay_network, requests really go over sockets through the shared
+    session (pooling, retries, metrics, conditional GET with ETags), so load
+    tests see realistic client-side cost. `latency` adds a per-request delay
+    in seconds to mimic the real upstreams.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from utils import http
+
+    routes = {
+        _stub_key(url): (content, content_type, '"%s"' % hashlib.blake2b(content, digest_size=8).hexdigest())
+        for url, (content, content_type) in payloads.items()
+    }
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            route = routes.get(self.path.lstrip("/"))
+            if route is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            content, content_type, etag = route
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type or "application/octet-stream")
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-upstream", daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    original = http.get
+
+    def stub_get(url, source=None, timeout=None, **kwargs):
+        return original(base + _stub_key(url), source=source or http.source_for(url), timeout=timeout, **kwargs)
+
+    http.get = stub_get
+    try:
+        yield base
+    finally:
+        http.get = original
+        server.shutdown()
+        server.server_close()
+
+
+def reset_caches():
+    """
+    Forget every decoded feed and cached forecast so the next call pays
+    the full download + decode + extract cost again.
+    """
+    from utils import feeds, get_l_train_arrivals, weather
+    feeds._states.clear()
+    get_l_train_arrivals._boards.clear()
+    with weather._forecast_lock:
+        weather._forecast_cache.clear()
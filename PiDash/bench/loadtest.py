@@ -0,0 +1,158 @@
+"""
+Drive app.py headlessly with N concurrent sessions and report how rerun
+latency, CPU and memory grow with the session count.
+
+Upstreams are local stub servers answering from bench/fixtures/, so the
+whole fetch path (sockets, pooling, conditional GET) is exercised offline.
+
+    python bench/loadtest.py                          # 1, 2, 4, 8 sessions
+    python bench/loadtest.py --sessions 1 8 32 --reruns 20 --interval 1
+    python bench/loadtest.py --json load.json
+
+Each session is a streamlit.testing AppTest rerunning the full script once
+per --interval seconds. In production a full rerun only happens when a
+session connects; the recurring 15 s cost is the four panel fragments
+rerunning, which AppTest cannot drive on their own (it starts a fresh
+script runner, and fragment storage, for every run). A full rerun also
+re-sends the CSS and lays out the columns, so treat these numbers as an
+upper bound on the recurring refresh cost, and as the cost of a new
+session connecting.
+
+"overlap" counts ticks where rerunning every session took longer than the
+interval, i.e. where even full reruns would start to pile up on the Pi.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+# Keep the disk cache and NWS points out of the user's real cache directory
+os.environ.setdefault("PIDASH_CACHE_DIR", tempfile.mkdtemp(prefix="pidash-load-"))
+
+from fixtures import PIDASH_DIR, load_payloads, stub_upstreams
+
+APP = os.path.join(PIDASH_DIR, "app.py")
+
+
+def rss_kb():
+    # Current (not peak) resident set size, from /proc where available
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 if sys.platform == "darwin" else rss
+
+
+def _percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+def run_level(sessions, reruns, interval):
+    """
+    Rerun `sessions` AppTest sessions round-robin, `reruns` full-page
+    reruns each.
+
+    AppTest installs one global Streamlit runtime per run, so sessions can't
+    rerun in parallel threads; they take turns instead. That is also what the
+    Pi does under the GIL for CPU-bound reruns, so a tick (every session
+    rerunning once) that takes longer than `interval` is the point where the
+    real kiosk's reruns start to overlap.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    apps = [AppTest.from_file(APP, default_timeout=60) for _ in range(sessions)]
+    latencies = []
+    ticks = []
+    errors = []
+    rss_before = rss_kb()
+    cpu_before = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(reruns):
+        tick_start = time.perf_counter()
+        for at in apps:
+            started = time.perf_counter()
+            try:
+                at.run()
+                if at.exception:
+                    errors.append(str(at.exception[0].message))
+            except Exception as e:
+                errors.append(str(e))
+            latencies.append((time.perf_counter() - started) * 1000)
+        tick = time.perf_counter() - tick_start
+        ticks.append(tick * 1000)
+        time.sleep(max(0.0, interval - tick))
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_before
+    return {
+        "sessions": sessions,
+        "reruns": len(latencies),
+        "p50_ms": _percentile(latencies, 50),
+        "p90_ms": _percentile(latencies, 90),
+        "p99_ms": _percentile(latencies, 99),
+        "max_ms": max(latencies, default=0.0),
+        "tick_p90_ms": _percentile(ticks, 90),
+        "overlapping": sum(1 for ms in ticks if ms > interval * 1000),
+        "cpu_percent": 100 * cpu / wall if wall else 0.0,
+        "cpu_ms_per_rerun": 1000 * cpu / len(latencies) if latencies else 0.0,
+        "rss_kb": rss_kb(),
+        "rss_growth_kb": rss_kb() - rss_before,
+        "errors": errors[:5],
+    }
+
+
+def print_table(results):
+    print(f"{'sessions':>8}{'reruns':>8}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+          f"{'tick p90':>10}{'overlap':>9}{'CPU %':>8}{'CPU ms/run':>11}{'RSS MB':>9}{'+RSS MB':>9}")
+    for r in results["levels"]:
+        print(f"{r['sessions']:>8}{r['reruns']:>8}{r['p50_ms']:>9.1f}{r['p90_ms']:>9.1f}{r['p99_ms']:>9.1f}"
+              f"{r['max_ms']:>9.1f}{r['tick_p90_ms']:>10.1f}{r['overlapping']:>9}{r['cpu_percent']:>8.0f}{r['cpu_ms_per_rerun']:>11.1f}"
+              f"{r['rss_kb'] / 1024:>9.1f}{r['rss_growth_kb'] / 1024:>9.1f}")
+        for error in r["errors"]:
+            print(f"    error: {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--reruns", type=int, default=10, help="reruns per session at each level")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between a session's reruns")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub upstream latency in seconds")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    payloads = load_payloads()
+    if not payloads:
+        print("No fixtures found; run bench/record.py first.")
+        return 2
+
+    # app.py resolves `utils` relative to its own directory
+    os.chdir(PIDASH_DIR)
+    results = {"interval": args.interval, "levels": []}
+    with stub_upstreams(payloads, latency=args.latency):
+        # Warm the shared snapshot once so level 1 isn't charged for the first fetch
+        from utils.snapshot import get_snapshot
+        get_snapshot()
+        results["baseline_rss_kb"] = rss_kb()
+        for sessions in args.sessions:
+            results["levels"].append(run_level(sessions, args.reruns, args.interval))
+    print("Full-page reruns: an upper bound on the recurring fragment refresh (see --help)")
+    print_table(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if any(level["errors"] for level in results["levels"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
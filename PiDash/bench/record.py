@@ -0,0 +1,55 @@
+"""
+Record real upstream payloads into bench/fixtures/ for offline replay.
+
+    python bench/record.py                      # L feed, alerts, NWS weather
+    python bench/record.py --feeds l g jz ace   # extra subway feeds
+"""
+import argparse
+import json
+import os
+
+from fixtures import FIXTURES_DIR, MANIFEST, load_manifest
+
+from utils import http
+from utils.feeds import FEED_PATHS, feed_url
+from utils.weather import POINTS_URL
+from utils.snapshot import LAT, LON
+
+
+def _save(fixtures_dir, manifest, url, name, response):
+    response.raise_for_status()
+    with open(os.path.join(fixtures_dir, name), "wb") as f:
+        f.write(response.content)
+    manifest[url] = {"file": name, "content_type": response.headers.get("Content-Type", "")}
+    print(f"recorded {name:<24} {len(response.content):>9,} bytes  {url}")
+
+
+def record(feeds, lat, lon, fixtures_dir=FIXTURES_DIR):
+    os.makedirs(fixtures_dir, exist_ok=True)
+    manifest = load_manifest(fixtures_dir)
+
+    for name in feeds:
+        url = feed_url(name)
+        _save(fixtures_dir, manifest, url, f"feed_{name}.pb", http.get(url, source="mta"))
+
+    points_url = POINTS_URL.format(lat=lat, lon=lon)
+    points = http.get(points_url, source="nws")
+    _save(fixtures_dir, manifest, points_url, "nws_points.json", points)
+    properties = points.json()["properties"]
+    _save(fixtures_dir, manifest, properties["forecast"], "nws_forecast.json",
+          http.get(properties["forecast"], source="nws"))
+    _save(fixtures_dir, manifest, properties["forecastHourly"], "nws_hourly.json",
+          http.get(properties["forecastHourly"], source="nws"))
+
+    with open(os.path.join(fixtures_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--feeds", nargs="+", default=["l", "alerts"], choices=sorted(FEED_PATHS))
+    parser.add_argument("--lat", type=float, default=LAT)
+    parser.add_argument("--lon", type=float, default=LON)
+    parser.add_argument("--out", default=FIXTURES_DIR)
+    args = parser.parse_args()
+    record(args.feeds, args.lat, args.lon, args.out)
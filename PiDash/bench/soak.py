@@ -0,0 +1,221 @@
+"""
+Replay hours of feed updates in minutes and check that memory stays flat.
+
+    python bench/soak.py                          # 6 simulated hours from fixtures
+    python bench/soak.py --hours 48 --trace       # longer, with per-module growth
+    python bench/soak.py --archive /path          # replay a PIDASH_ARCHIVE_DIR recording
+
+Every --step seconds of simulated time the full refresh runs (fetch, decode,
+index, history, diff) and the board, page and JSON are rendered, as a
+long-running kiosk would. Without --archive each step serves a new version
+of the recorded GTFS-rt fixtures: times shifted forward and trip ids
+rotated every few minutes, so trips keep arriving and leaving.
+
+RSS is sampled every --sample-minutes after a forced GC. Once the --warmup
+hours have filled the caches and the feed history ring buffer, RSS must grow by
+no more than --max-growth-mb over the rest of the run or the exit status is 1.
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Keep the disk cache and NWS points out of the user's real cache directory
+os.environ.setdefault("PIDASH_CACHE_DIR", tempfile.mkdtemp(prefix="pidash-soak-"))
+
+from fixtures import load_payloads, replay_network, reset_caches
+
+from utils import archive, clock, history, memwatch
+from utils.feeds import MTA_FEED_BASE, ALERTS_FEED_URL
+from utils.render import page_html, trains_html, weather_html
+from utils.snapshot import SnapshotStore
+from server import snapshot_json
+
+# Trip ids change this often (simulated seconds), like trains finishing runs
+TRIP_ROTATION = 600
+
+
+def feed_variant(template, offset):
+    """
+    `template` (a FeedMessage) moved `offset` seconds into the future, as bytes.
+    """
+    feed = type(template)()
+    feed.CopyFrom(template)
+    feed.header.timestamp += offset
+    suffix = f"~{offset // TRIP_ROTATION}"
+    for entity in feed.entity:
+        if entity.HasField("trip_update"):
+            trip = entity.trip_update.trip
+            trip.trip_id += suffix
+            for update in entity.trip_update.stop_time_update:
+                if update.HasField("arrival"):
+                    update.arrival.time += offset
+                if update.HasField("departure"):
+                    update.departure.time += offset
+    return feed.SerializeToString()
+
+
+class FixtureFeeds:
+    """
+    Serves a fresh version of each recorded trip feed per simulated step.
+    """
+
+    def __init__(self, payloads):
+        from google.transit import gtfs_realtime_pb2
+
+        self.payloads = dict(payloads)
+        self.templates = {}
+        for url, (content, content_type) in payloads.items():
+            if url.startswith(MTA_FEED_BASE) and url != ALERTS_FEED_URL:
+                feed = gtfs_realtime_pb2.FeedMessage()
+                feed.ParseFromString(content)
+                self.templates[url] = (feed, content_type)
+        self.start = min((feed.header.timestamp for feed, _ in self.templates.values()), default=0) or time.time()
+
+    def advance(self, offset):
+        for url, (feed, content_type) in self.templates.items():
+            self.payloads[url] = (feed_variant(feed, offset), content_type)
+
+
+def render_all(snapshot):
+    # What every Streamlit rerun and server.py request would build
+    now = clock.datetime_now()
+    trains_html(snapshot.alerts, snapshot.arrivals, "", headways=snapshot.headways)
+    weather_html(snapshot.weather, "")
+    page_html(snapshot, now, now)
+    json.dumps(snapshot_json(snapshot))
+
+
+def _slope(points):
+    # Least-squares MB per simulated hour
+    if len(points) < 2:
+        return 0.0
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var if var else 0.0
+
+
+def settled_samples(hours, step, sample_minutes, warmup):
+    """
+    How many RSS samples a run takes after the warmup (at least two are
+    needed to say anything about growth).
+    """
+    steps = int(hours * 3600 / step)
+    sample_every = max(1, int(sample_minutes * 60 / step))
+    return sum(1 for i in range(0, steps + 1, sample_every) if int(i * step) / 3600 >= warmup)
+
+
+def soak(hours, step, sample_minutes, warmup, trace, archive_dir=None):
+    if archive_dir:
+        replay = archive.start_replay(archive_dir)
+        start = replay.start
+        hours = min(hours, (replay.reader.end - start) / 3600)
+        feeds = None
+        network = contextlib.nullcontext()
+    else:
+        feeds = FixtureFeeds(load_payloads())
+        start = feeds.start
+        # replay_network looks payloads up per request, so advance() takes effect at once
+        network = replay_network(feeds.payloads)
+
+    watch = memwatch.MemoryWatch(interval=0, budget_mb=0, trace=trace)
+    store = SnapshotStore(cache=None)
+    samples = []
+    warm_modules = None
+    steps = int(hours * 3600 / step)
+    sample_every = max(1, int(sample_minutes * 60 / step))
+    wall_start = time.perf_counter()
+    with network:
+        for i in range(steps + 1):
+            offset = int(i * step)
+            clock.use_virtual(start + offset)
+            if feeds is not None:
+                feeds.advance(offset)
+            render_all(store.refresh())
+            if i % sample_every:
+                continue
+            gc.collect()
+            report = watch.sample()
+            at = offset / 3600
+            samples.append({
+                "hours": at,
+                "rss_mb": report["rss"] / 2**20,
+                "protobuf": sum(report["protobuf"].values()),
+                "traced_mb": report["traced"] / 2**20 if report["traced"] is not None else None,
+            })
+            if trace and warm_modules is None and at >= warmup:
+                warm_modules = watch.modules
+            print(f"{at:7.1f} h  RSS {samples[-1]['rss_mb']:7.1f} MB  {samples[-1]['protobuf']:6} protobuf messages",
+                  flush=True)
+
+    settled = [s for s in samples if s["hours"] >= warmup]
+    growth = max(s["rss_mb"] for s in settled) - settled[0]["rss_mb"] if settled else 0.0
+    result = {
+        "hours": hours,
+        "steps": steps,
+        "wall_seconds": time.perf_counter() - wall_start,
+        "samples": samples,
+        "settled_samples": len(settled),
+        "growth_mb": growth,
+        "slope_mb_per_hour": _slope([(s["hours"], s["rss_mb"]) for s in settled]),
+        "growth_by_module": [],
+    }
+    if trace and warm_modules is not None:
+        result["growth_by_module"] = memwatch.diff_by_module(warm_modules, watch.modules)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=6, help="simulated hours to replay")
+    parser.add_argument("--step", type=float, default=30, help="simulated seconds between refreshes")
+    parser.add_argument("--sample-minutes", type=float, default=30, help="simulated minutes between RSS samples")
+    parser.add_argument("--warmup", type=float, help="simulated hours before RSS must be flat "
+                        "(default: until the feed history ring buffer is full, plus 30 min)")
+    parser.add_argument("--max-growth-mb", type=float, default=4, help="allowed RSS growth after warmup")
+    parser.add_argument("--trace", action="store_true", help="tracemalloc diff by module (slower)")
+    parser.add_argument("--archive", help="replay this PIDASH_ARCHIVE_DIR instead of the fixtures")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    if not args.archive and not load_payloads():
+        print("No fixtures found; run bench/record.py first.")
+        return 2
+
+    if args.warmup is None:
+        args.warmup = history.CAPACITY * args.step / 3600 + 0.5
+    if settled_samples(args.hours, args.step, args.sample_minutes, args.warmup) < 2:
+        print(f"--hours {args.hours} leaves fewer than two RSS samples after the {args.warmup:.1f} h warmup; "
+              "run longer, or lower --warmup / --sample-minutes")
+        return 2
+    reset_caches()
+    try:
+        result = soak(args.hours, args.step, args.sample_minutes, args.warmup, args.trace, args.archive)
+    finally:
+        clock.use_real()
+
+    print(f"\n{result['steps']} refreshes over {result['hours']:.1f} simulated hours in {result['wall_seconds']:.0f} s")
+    print(f"RSS growth after warmup: {result['growth_mb']:+.1f} MB ({result['slope_mb_per_hour']:+.2f} MB/h)")
+    for module, delta, size in result["growth_by_module"]:
+        print(f"    {module:<32}{delta / 1024:+10.1f} KB{size / 1024:12.1f} KB")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    if result["settled_samples"] < 2:
+        # e.g. an archive shorter than --hours
+        print("FAIL: fewer than two RSS samples after warmup, nothing was checked")
+        return 1
+    if result["growth_mb"] > args.max_growth_mb:
+        print(f"FAIL: RSS grew more than {args.max_growth_mb} MB after warmup")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
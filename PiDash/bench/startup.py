@@ -0,0 +1,91 @@
+"""
+Cold-start import report for the dashboard.
+
+Runs the imports app.py makes in a fresh interpreter under `python -X
+importtime` and prints the slowest modules, so cold start on the Pi can be
+kept under a budget.
+
+    python bench/startup.py                  # top 25 modules
+    python bench/startup.py --budget-ms 1500 # exit 1 if total is over budget
+"""
+import argparse
+import ast
+import os
+import subprocess
+import sys
+
+from fixtures import PIDASH_DIR
+
+APP = os.path.join(PIDASH_DIR, "app.py")
+
+
+def app_imports(path=APP):
+    """
+    Top-level import statements of app.py and the modules each one loads.
+
+    Returns:
+        list: [(statement source, [module names]), ...] in source order.
+    """
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    imports = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            # `from utils import clock` loads utils.clock; `from a.b import f` loads a.b
+            names = [f"{node.module}.{alias.name}" for alias in node.names] + [node.module]
+        else:
+            continue
+        imports.append((ast.unparse(node), names))
+    return imports
+
+
+def measure(statements):
+    """
+    {module: (self_us, cumulative_us)} from `-X importtime` for one cold run.
+    """
+    code = "\n".join(statements)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=PIDASH_DIR, capture_output=True, text=True, check=True,
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--budget-ms", type=float, help="fail if app imports take longer than this")
+    args = parser.parse_args(argv)
+
+    imports = app_imports()
+    timings = measure([statement for statement, _ in imports])
+
+    print(f"{'app import':<60}{'cumulative ms':>15}")
+    total_us = 0
+    for statement, names in imports:
+        cumulative = sum(timings.get(name, (0, 0))[1] for name in names)
+        total_us += cumulative
+        print(f"{statement[:58]:<60}{cumulative / 1000:>15.1f}")
+    print(f"{'total':<60}{total_us / 1000:>15.1f}\n")
+
+    print(f"{'slowest modules (self)':<60}{'self ms':>15}")
+    slowest = sorted(timings.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+    for name, (self_us, _) in slowest:
+        print(f"{name:<60}{self_us / 1000:>15.1f}")
+
+    if args.budget_ms is not None and total_us / 1000 > args.budget_ms:
+        print(f"\nOVER BUDGET: {total_us / 1000:.0f} ms > {args.budget_ms:.0f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
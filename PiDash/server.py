@@ -0,0 +1,209 @@
+"""
+Lightweight alternative to `streamlit run app.py` for kiosks.
+
+    python server.py                  # http://0.0.0.0:8080/
+    python server.py --port 9000
+
+Serves the same snapshot the Streamlit app renders:
+
+    /                 pre-rendered HTML page (reloads itself every 15 s)
+    /api/snapshot     JSON of the current data and per-source freshness
+    /healthz          "ok" once the first snapshot is ready
+
+One asyncio event loop, no Streamlit runtime or websockets. Responses are
+rendered once per data version (and per minute for the clock) and the same
+bytes are sent to every viewer, so extra viewers cost a socket, not a render.
+"""
+import argparse
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import os
+import time
+
+import pytz
+
+from utils import clock, memwatch
+from utils.metrics import metrics
+from utils.models import to_json
+from utils.render import countdowns, page_html
+from utils.snapshot import get_snapshot, store
+
+HOST = os.environ.get("PIDASH_SERVER_HOST", "0.0.0.0")
+PORT = int(os.environ.get("PIDASH_SERVER_PORT", 8080))
+PAGE_REFRESH = 15
+NYC = pytz.timezone("America/New_York")
+
+# Requests are a GET line and a few headers; anything bigger is not a browser
+MAX_HEADER_BYTES = 8192
+# Idle keep-alive connections are closed after this many seconds
+KEEPALIVE_TIMEOUT = 30
+
+_responses = {}
+memwatch.register_purge("server-responses", _responses.clear)
+
+
+def snapshot_json(snapshot, now=None):
+    """
+    The snapshot as plain JSON data. Arrivals also get the board's
+    `minutes` as of `now`, since the records only hold epochs.
+    """
+    now = clock.now() if now is None else now
+    status = {
+        name: {
+            "age": snapshot.age(name, now),
+            "error": source.error,
+            "breaker": source.breaker,
+            "version": source.version,
+            "restored": source.restored,
+        }
+        for name, source in snapshot.status.items()
+    }
+    arrivals = {}
+    for stop_id, rows in snapshot.arrivals.items():
+        arrivals[stop_id] = [
+            {**to_json(arrival), "minutes": arrival.minutes(now)}
+            for arrival in rows
+            if arrival.minutes(now) is not None
+        ]
+    return {
+        "version": snapshot.version,
+        "updated_at": snapshot.updated_at,
+        "weather": to_json(snapshot.weather),
+        "alerts": to_json(snapshot.alerts),
+        "arrivals": arrivals,
+        "headways": to_json(snapshot.headways),
+        "status": status,
+    }
+
+
+def _countdown_tag(snapshot, now):
+    # Short digest of every arrival's minutes as served in /api/snapshot
+    minutes = [(stop_id, [arrival.minutes(now) for arrival in rows]) for stop_id, rows in snapshot.arrivals.items()]
+    return hashlib.blake2b(repr(minutes).encode(), digest_size=6).hexdigest()
+
+
+def _cached(name, key, build):
+    # One body per (data version, ...) shared by every request
+    hit = _responses.get(name)
+    if hit is None or hit[0] != key:
+        with metrics.timer("render_seconds", panel=f"server-{name}"):
+            hit = _responses[name] = (key, build())
+    return hit[1]
+
+
+def render(path):
+    """
+    Returns:
+        tuple: (status, content type, body bytes, etag or None)
+    """
+    snapshot = store.get()
+    if path == "/":
+        nyc_time = clock.datetime_now(NYC)
+        # The clock changes every minute and countdowns whenever a train's minute ticks over
+        key = (snapshot.version, nyc_time.strftime("%Y%m%d%H%M"), tuple(countdowns(snapshot.arrivals).values()))
+        updated_time = datetime.datetime.fromtimestamp(snapshot.updated_at or clock.now(), NYC)
+        body = _cached("page", key, lambda: page_html(snapshot, nyc_time, updated_time, PAGE_REFRESH).encode())
+        return 200, "text/html; charset=utf-8", body, None
+    if path == "/api/snapshot":
+        # Ages in the body go stale within a second; clients revalidate with
+        # the etag, which also changes whenever an arrival's minutes tick over
+        now = clock.now()
+        key = (snapshot.version, int(now))
+        body = _cached("api", key, lambda: json.dumps(snapshot_json(snapshot, now)).encode())
+        return 200, "application/json", body, f'"{snapshot.version}-{_countdown_tag(snapshot, now)}"'
+    if path == "/healthz":
+        ready = store.wait_ready(0)
+        return (200 if ready else 503), "text/plain", b"ok" if ready else b"starting", None
+    return 404, "text/plain", b"not found", None
+
+
+REASONS = {
+    200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+def _response(status, content_type, body, etag=None, keep_alive=True, head=False):
+    headers = [
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        "Cache-Control: no-cache",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    if etag:
+        headers.append(f"ETag: {etag}")
+    head_bytes = ("\r\n".join(headers) + "\r\n\r\n").encode()
+    return head_bytes if head else head_bytes + body
+
+
+async def handle(reader, writer):
+    try:
+        while True:
+            try:
+                raw = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE_TIMEOUT)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                return
+            start = time.perf_counter()
+            lines = raw.decode("latin-1").split("\r\n")
+            parts = lines[0].split()
+            if len(parts) != 3:
+                writer.write(_response(400, "text/plain", b"bad request", keep_alive=False))
+                return
+            method, target, version = parts
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(":")
+                if name:
+                    headers[name.strip().lower()] = value.strip()
+            keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+
+            if method not in ("GET", "HEAD"):
+                status, content_type, body, etag = 405, "text/plain", b"method not allowed", None
+            else:
+                try:
+                    status, content_type, body, etag = render(target.split("?", 1)[0])
+                except Exception as e:
+                    logging.error(f"{method} {target} failed: {e!r}", exc_info=True)
+                    status, content_type, body, etag = 500, "text/plain", b"internal server error", None
+                    keep_alive = False
+            if etag and headers.get("if-none-match") == etag:
+                status, body = 304, b""
+            writer.write(_response(status, content_type, body, etag, keep_alive, head=method == "HEAD"))
+            await writer.drain()
+            metrics.observe("server_seconds", time.perf_counter() - start, status=status)
+            if not keep_alive:
+                return
+    finally:
+        writer.close()
+
+
+async def serve(host=HOST, port=PORT):
+    # Blocks until the first refresh (or the disk cache) has data, like app.py
+    await asyncio.get_running_loop().run_in_executor(None, get_snapshot)
+    server = await asyncio.start_server(handle, host, port, limit=MAX_HEADER_BYTES)
+    logging.info(f"Serving PiDash on http://{host}:{port}/")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=os.environ.get("PIDASH_LOG_LEVEL", "INFO").upper(),
+        format='%(asctime)s - %(levelname)s - %(message)s',
+    )
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import logging
+
+from utils.disk_cache import DiskCache
+
+
+def test_round_trip(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite"))
+    cache.set("key", {"a": 1}, ttl=60)
+    value, _ = cache.get("key")
+    assert value == {"a": 1}
+    cache.delete("key")
+    assert cache.get("key") is None
+
+
+def test_unusable_directory_runs_without_cache(caplog):
+    cache = DiskCache("/proc/nope/cache.sqlite")
+    with caplog.at_level(logging.ERROR):
+        assert cache.get("key") is None
+        cache.set("key", [1])
+        cache.delete("key")
+        cache.purge()
+        assert cache.get("key") is None
+    # Logged once, not on every call
+    assert len(caplog.records) == 1
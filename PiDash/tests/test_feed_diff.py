@@ -0,0 +1,175 @@
+from google.transit import gtfs_realtime_pb2
+
+from utils import feeds, history
+from utils.alert_index import build_alert_index
+from utils.feed_diff import DIFFERENTIAL, FULL_DATASET, AlertTracker, FeedTracker, TripTracker
+from utils.get_l_train_arrivals import ArrivalBoard
+from utils.stop_index import build_stop_index, build_stop_index_from_wire
+
+
+def make_feed(trips, incrementality=FULL_DATASET, deleted=(), timestamp=1000):
+    """
+    trips: {trip_id: {stop_id: arrival epoch}}, all on the L.
+    """
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = "2.0"
+    feed.header.incrementality = incrementality
+    feed.header.timestamp = timestamp
+    for trip_id, stops in trips.items():
+        entity = feed.entity.add()
+        entity.id = trip_id
+        entity.trip_update.trip.trip_id = trip_id
+        entity.trip_update.trip.route_id = "L"
+        for stop_id, timestamp in stops.items():
+            update = entity.trip_update.stop_time_update.add()
+            update.stop_id = stop_id
+            update.arrival.time = timestamp
+    for trip_id in deleted:
+        entity = feed.entity.add()
+        entity.id = trip_id
+        entity.is_deleted = True
+    return feed
+
+
+def by_kind(events):
+    return {(event.kind, event.key): event.stops for event in events}
+
+
+def test_differential_merges_and_deletes():
+    tracker = FeedTracker()
+    tracker.update(make_feed({"a": {"L15S": 100}, "b": {"L15S": 200}}))
+    tracker.update(make_feed({"c": {"L15S": 300}}, DIFFERENTIAL, deleted=["a"]))
+    # Trips the delta didn't mention are kept, deleted ones dropped
+    merged = tracker.message()
+    assert merged.header.incrementality == FULL_DATASET
+    assert sorted(entity.id for entity in merged.entity) == ["b", "c"]
+
+    # A full dataset replaces the set
+    tracker.update(make_feed({"d": {"L15S": 400}}))
+    assert [entity.id for entity in tracker.message().entity] == ["d"]
+
+
+def test_trip_tracker_diffs_stop_indexes():
+    tracker = TripTracker()
+    old = build_stop_index_from_wire(make_feed({"a": {"L15S": 100, "L16S": 160}, "b": {"L15S": 200}}).SerializeToString())
+    tracker.update(old)
+    assert tracker.base is None
+    assert {event.kind for event in tracker.events} == {"trip_added"}
+
+    new = build_stop_index_from_wire(make_feed({"a": {"L15S": 100, "L16S": 190}, "c": {"L15N": 300}}).SerializeToString())
+    events = tracker.update(new)
+    assert tracker.base is not None and tracker.version != tracker.base
+    assert by_kind(events) == {
+        ("trip_changed", "a"): (("L16S", 160, 190),),
+        ("trip_added", "c"): (("L15N", None, 300),),
+        ("trip_removed", "b"): (("L15S", 200, None),),
+    }
+    assert {event.route_id for event in events} == {"L"}
+
+
+def make_alerts(alerts):
+    """
+    alerts: {alert id: header text}, all on the L.
+    """
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = "2.0"
+    for alert_id, header in alerts.items():
+        entity = feed.entity.add()
+        entity.id = alert_id
+        entity.alert.header_text.translation.add().text = header
+        entity.alert.informed_entity.add().route_id = "L"
+    return feed
+
+
+def test_alert_tracker_added_changed_expired():
+    tracker = AlertTracker()
+    tracker.update(build_alert_index(make_alerts({"1": "Delays", "2": "Skip stops"})))
+    assert by_kind(tracker.events) == {("alert_added", "1"): (), ("alert_added", "2"): ()}
+
+    events = tracker.update(build_alert_index(make_alerts({"1": "Severe delays", "3": "Shuttle buses"})))
+    assert by_kind(events) == {
+        ("alert_changed", "1"): (),
+        ("alert_added", "3"): (),
+        ("alert_expired", "2"): (),
+    }
+    assert tracker.update(build_alert_index(make_alerts({"1": "Severe delays", "3": "Shuttle buses"}))) == ()
+
+
+def test_board_applies_events_like_a_reload():
+    tracker = TripTracker()
+    board = ArrivalBoard(["L15S", "L15N"])
+    versions = [
+        {"a": {"L15S": 100}, "b": {"L15S": 200}},
+        {"a": {"L15S": 130}, "c": {"L15N": 300}},
+        {"c": {"L15N": 280}, "d": {"L15S": 400, "L16S": 450}},
+    ]
+    results = []
+    for trips in versions:
+        index = build_stop_index(make_feed(trips))
+        tracker.update(index)
+        results.append(board.update(tracker.base, tracker.version, tracker.events, index))
+        for stop_id in ("L15S", "L15N"):
+            assert board.arrivals(stop_id) == index.arrivals(stop_id)
+    assert results == ["reloaded", "applied", "applied"]
+    assert board.update(tracker.base, tracker.version, tracker.events, index) == "current"
+
+    # A board that missed a version rebuilds from the index instead
+    late = ArrivalBoard(["L15S"])
+    late.update(None, -1, (), build_stop_index(make_feed(versions[0])))
+    assert late.update(tracker.base, tracker.version, tracker.events, index) == "reloaded"
+    assert late.arrivals("L15S", after=401) == []
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+def test_differential_feed_is_tracked_and_diffed(monkeypatch):
+    url = "https://example.invalid/differential"
+    payloads = [
+        make_feed({"a": {"L15S": 100}, "b": {"L15S": 200}}, DIFFERENTIAL, timestamp=1000),
+        make_feed({"c": {"L15S": 300}}, DIFFERENTIAL, deleted=["a"], timestamp=1030),
+    ]
+    monkeypatch.setattr(feeds.http, "get", lambda *args, **kwargs: FakeResponse(payloads[0].SerializeToString()))
+    try:
+        first = feeds.trip_events(url, feeds.get_stop_index(url))
+        assert feeds._state_for(url).tracker is not None
+
+        payloads.pop(0)
+        base, version, events, index = feeds.trip_events(url, feeds.get_stop_index(url))
+        assert base == first[1]
+        assert by_kind(events) == {
+            ("trip_added", "c"): (("L15S", None, 300),),
+            ("trip_removed", "a"): (("L15S", 100, None),),
+        }
+        # The index covers the merged set, not just the delta
+        assert [row[1] for row in index.arrivals("L15S")] == ["b", "c"]
+        # Asking again for the same index does not diff it twice
+        assert feeds.trip_events(url, index)[:2] == (base, version)
+    finally:
+        feeds._states.pop(url, None)
+        history._histories.pop(url, None)
+
+
+def test_alert_events_run_for_full_dataset_feeds(monkeypatch):
+    url = "https://example.invalid/alerts"
+    payloads = [make_alerts({"1": "Delays"}), make_alerts({"2": "Shuttle buses"})]
+    monkeypatch.setattr(feeds.http, "get", lambda *args, **kwargs: FakeResponse(payloads[0].SerializeToString()))
+    try:
+        index = feeds.get_extracted(url, "alert_index", build_alert_index)
+        first = feeds.alert_events(url, index)
+        payloads.pop(0)
+        index = feeds.get_extracted(url, "alert_index", build_alert_index)
+        base, _, events, _ = feeds.alert_events(url, index)
+        assert base == first[1]
+        assert by_kind(events) == {("alert_added", "2"): (), ("alert_expired", "1"): ()}
+    finally:
+        feeds._states.pop(url, None)
+        history._histories.pop(url, None)
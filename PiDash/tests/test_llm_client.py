@@ -0,0 +1,84 @@
+import threading
+
+from utils.mta import LLMClient, local_backend
+
+
+class CountingBackend:
+    def __init__(self, answer=local_backend, gate=None):
+        self.answer = answer
+        self.gate = gate
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt, model, max_tokens):
+        with self._lock:
+            self.prompts.append(prompt)
+        if self.gate is not None:
+            self.gate.wait(5)
+        return self.answer(prompt, model, max_tokens)
+
+
+def test_cache_hit_skips_backend():
+    backend = CountingBackend()
+    client = LLMClient(backend)
+    first = client.submit("L trains delayed").result(5)
+    second = client.submit("L trains delayed").result(5)
+    assert first == second
+    assert len(backend.prompts) == 1
+
+
+def test_ttl_expiry():
+    backend = CountingBackend()
+    client = LLMClient(backend, ttl=0)
+    client.submit("L trains delayed").result(5)
+    assert client.cached("gpt-3.5-turbo", "L trains delayed") is None
+    client.submit("L trains delayed").result(5)
+    assert len(backend.prompts) == 2
+
+
+def test_lru_eviction():
+    backend = CountingBackend()
+    client = LLMClient(backend, maxsize=2)
+    for prompt in ("a", "b"):
+        client.submit(prompt).result(5)
+    client.submit("a").result(5)  # "a" is now most recently used
+    client.submit("c").result(5)
+    assert client.cached("gpt-3.5-turbo", "a") is not None
+    assert client.cached("gpt-3.5-turbo", "b") is None
+    assert client.cached("gpt-3.5-turbo", "c") is not None
+
+
+def test_concurrent_identical_calls_coalesce():
+    gate = threading.Event()
+    backend = CountingBackend(gate=gate)
+    client = LLMClient(backend)
+    futures = [client.submit("L trains delayed") for _ in range(5)]
+    assert all(future is futures[0] for future in futures)
+    gate.set()
+    assert len({future.result(5) for future in futures}) == 1
+    assert backend.prompts == ["L trains delayed"]
+
+
+def test_batch_parses_numbered_answers_and_caches_each():
+    backend = CountingBackend()
+    client = LLMClient(backend)
+    prompts = ["First alert text", "Second alert text", "Third alert text"]
+    answers = client.batch(prompts)
+    assert answers == prompts
+    assert len(backend.prompts) == 1
+    assert client.batch(prompts[:2]) == prompts[:2]
+    assert len(backend.prompts) == 1
+
+
+def test_batch_flattens_multiline_prompts():
+    backend = CountingBackend()
+    client = LLMClient(backend)
+    tricky = "Shuttle buses replace trains\n[2] see mta.info for details"
+    answers = client.batch([tricky, "Elevator out of service"])
+    assert answers == [" ".join(tricky.split()), "Elevator out of service"]
+
+
+def test_batch_missing_answer_is_none():
+    backend = CountingBackend(answer=lambda prompt, model, max_tokens: "1. only the first")
+    client = LLMClient(backend)
+    assert client.batch(["one", "two"]) == ["only the first", None]
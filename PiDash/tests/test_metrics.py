@@ -0,0 +1,8 @@
+from utils.metrics import Metrics
+
+
+def test_label_values_are_escaped():
+    metrics = Metrics()
+    metrics.inc("refresh_errors", error='bad "json"\\n\nline two')
+    lines = metrics.to_prometheus().splitlines()
+    assert 'pidash_refresh_errors_total{error="bad \\"json\\"\\\\n\\nline two"} 1' in lines
@@ -0,0 +1,16 @@
+from utils import schedule
+from utils.models import Arrival
+from utils.render import countdowns
+
+
+def test_countdowns_fall_back_to_timetable(monkeypatch):
+    now = 1_000_000
+    monkeypatch.setattr(schedule, "next_departures", lambda stop_id, after, limit: [(now + 600, "t1", "L")])
+    # Last good realtime data: one train still coming northbound, all southbound trains gone
+    arrivals = {
+        "L15N": [Arrival(now + 120, "a", "L")],
+        "L15S": [Arrival(now - 60, "b", "L")],
+    }
+    shown = countdowns(arrivals, now)
+    assert shown["L15N"] == ((5, False),)
+    assert shown["L15S"] == ((13, True),)
@@ -0,0 +1,15 @@
+from utils import scheduler
+from utils.scheduler import RefreshScheduler
+
+
+def test_expiry_policy_polls_at_expiry(monkeypatch):
+    monkeypatch.setattr(scheduler, "is_overnight", lambda now=None: True)
+    policies = {
+        "weather": {"interval": 900, "min": 60, "max": 1800, "expiry": True},
+        "alerts": {"interval": 900, "min": 60, "max": 1800, "overnight": 2},
+    }
+    schedule = RefreshScheduler(policies, 15)
+    for _ in range(5):
+        assert schedule.interval("weather", None, changed=False) == 900
+    # Unchanged data and overnight hours still stretch other policies
+    assert schedule.interval("alerts", None, changed=False) > 1000
@@ -0,0 +1,15 @@
+from utils.weather import DEFAULT_TTL, cache_expiry
+
+
+def test_max_age_minus_age():
+    assert cache_expiry({"Cache-Control": "public, max-age=300", "Age": "120"}, now=1000) == 1180
+    assert cache_expiry({"Cache-Control": "max-age=300"}, now=1000) == 1300
+
+
+def test_age_past_max_age_is_already_stale():
+    assert cache_expiry({"Cache-Control": "max-age=300", "Age": "900"}, now=1000) == 1000
+
+
+def test_expires_and_default():
+    assert cache_expiry({"Expires": "Thu, 01 Jan 1970 00:20:00 GMT"}, now=0) == 1200
+    assert cache_expiry({}, now=1000) == 1000 + DEFAULT_TTL
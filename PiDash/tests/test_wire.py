@@ -0,0 +1,15 @@
+from google.transit import gtfs_realtime_pb2
+
+from utils import wire
+
+
+def test_header_fields():
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = "2.0"
+    feed.header.timestamp = 1700000000
+    content = feed.SerializeToString()
+    assert wire.header_timestamp(content) == 1700000000
+    assert wire.header_incrementality(content) == 0
+
+    feed.header.incrementality = gtfs_realtime_pb2.FeedHeader.DIFFERENTIAL
+    assert wire.header_incrementality(feed.SerializeToString()) == 1
@@ -0,0 +1,111 @@
+from bisect import bisect_left, bisect_right
+
+from utils.models import Alert
+
+# Open-ended active periods (start or end of 0 / unset in the feed)
+FOREVER = 2 ** 63 - 1
+
+
+class AlertIndex:
+    """
+    Lookup tables built from one decoded GTFS-realtime alerts feed.
+
+    alerts:    alert id -> {"id", "header", "description", "routes", "periods"}
+    by_route:  route_id -> frozenset of alert ids
+    intervals: every (start, end, alert id) active period, sorted by start,
+               with a running max of `end` so "active during [t0, t1]" is two
+               bisects plus a scan of only the candidate periods.
+
+    Alerts are kept as raw text and epochs; formatting happens at render time.
+    """
+
+    def __init__(self, alerts, by_route, intervals, timestamp=0):
+        self.alerts = alerts
+        self.by_route = by_route
+        self.intervals = intervals
+        self.timestamp = timestamp
+        self._starts = [start for start, _, _ in intervals]
+        self._max_end = []
+        running = -1
+        for _, end, _ in intervals:
+            running = max(running, end)
+            self._max_end.append(running)
+
+    def active(self, t0, t1=None):
+        """
+        {alert id: latest start of a period overlapping [t0, t1]}.
+        """
+        t1 = t0 if t1 is None else t1
+        # Periods starting after t1 can't overlap; neither can any period before
+        # the first point where the running max end reaches t0
+        lo = bisect_left(self._max_end, t0)
+        hi = bisect_right(self._starts, t1)
+        matches = {}
+        for start, end, alert_id in self.intervals[lo:hi]:
+            if end >= t0:
+                matches[alert_id] = max(start, matches.get(alert_id, 0))
+        return matches
+
+    def query(self, routes, t0, t1=None):
+        """
+        Alerts for any of `routes` active at some point in [t0, t1], newest first.
+
+        Returns:
+            list: [Alert, ...] where timestamp is the start of the latest
+            matching period (0 if open-ended).
+        """
+        if isinstance(routes, str):
+            routes = (routes,)
+        wanted = set()
+        for route_id in routes:
+            wanted |= self.by_route.get(route_id, frozenset())
+        if not wanted:
+            return []
+        results = [
+            Alert(alert_id, self.alerts[alert_id]["header"], self.alerts[alert_id]["description"], start)
+            for alert_id, start in self.active(t0, t1).items()
+            if alert_id in wanted
+        ]
+        results.sort(key=lambda alert: alert.timestamp, reverse=True)
+        return results
+
+
+def _text(translated):
+    return translated.translation[0].text if translated.translation else ""
+
+
+def build_alert_index(feed):
+    """
+    Walk every alert entity once and build an AlertIndex over all its active periods.
+    """
+    alerts = {}
+    by_route = {}
+    intervals = []
+    for entity in feed.entity:
+        if not entity.HasField("alert"):
+            continue
+        alert = entity.alert
+        header = _text(alert.header_text)
+        description = _text(alert.description_text)
+        if not (header or description):
+            continue
+        routes = tuple(dict.fromkeys(info.route_id for info in alert.informed_entity if info.route_id))
+        # No active_period means the alert is active for as long as it is in the feed
+        periods = tuple((p.start, p.end or FOREVER) for p in alert.active_period) or ((0, FOREVER),)
+        alerts[entity.id] = {
+            "id": entity.id,
+            "header": header,
+            "description": description,
+            "routes": routes,
+            "periods": periods,
+        }
+        for route_id in routes:
+            by_route.setdefault(route_id, set()).add(entity.id)
+        intervals.extend((start, end, entity.id) for start, end in periods)
+    intervals.sort()
+    return AlertIndex(
+        alerts,
+        {route_id: frozenset(ids) for route_id, ids in by_route.items()},
+        intervals,
+        feed.header.timestamp,
+    )
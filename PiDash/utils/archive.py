@@ -0,0 +1,271 @@
+"""
+Append-only, compressed archive of every upstream payload, plus offline replay.
+
+Recording (PIDASH_ARCHIVE_DIR=/path):
+    Each 200 response from utils.http.get is appended to the current segment
+    as one zlib-compressed record. A sidecar .idx file stores a fixed-size
+    (timestamp, offset, url hash) entry per record so replay can seek by time
+    without decompressing anything. Segments rotate at a size limit and the
+    oldest are deleted, so disk use is bounded by
+    PIDASH_ARCHIVE_SEGMENT_MB * PIDASH_ARCHIVE_MAX_SEGMENTS.
+
+Replay (PIDASH_REPLAY_DIR=/path, optional PIDASH_REPLAY_SPEED / PIDASH_REPLAY_START):
+    utils.http.get answers from the archive instead of the network, and
+    utils.clock runs a virtual clock so "minutes to arrival" etc. are computed
+    against the time the payloads were recorded.
+"""
+import bisect
+import glob
+import hashlib
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+
+from utils import clock
+
+MAGIC = b"PD"
+# timestamp, source length, url length, compressed payload length
+RECORD_HEADER = struct.Struct(">2sdHHI")
+# timestamp, record offset, crc32(url)
+INDEX_ENTRY = struct.Struct(">dQI")
+
+SEGMENT_BYTES = int(float(os.environ.get("PIDASH_ARCHIVE_SEGMENT_MB", 4)) * 1024 * 1024)
+MAX_SEGMENTS = int(os.environ.get("PIDASH_ARCHIVE_MAX_SEGMENTS", 25))
+
+
+def _url_key(url):
+    return zlib.crc32(url.encode())
+
+
+class ArchiveWriter:
+    """
+    Appends payloads to rotating segment files under `directory`.
+    Payloads identical to the previous one for the same URL are skipped,
+    since replay keeps serving the last record anyway.
+    """
+
+    def __init__(self, directory, segment_bytes=SEGMENT_BYTES, max_segments=MAX_SEGMENTS, level=6):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.level = level
+        self._lock = threading.Lock()
+        self._data = None
+        self._index = None
+        self._last_digest = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _open_segment(self, timestamp):
+        self.close()
+        base = os.path.join(self.directory, f"{int(timestamp * 1000):015d}")
+        self._data = open(base + ".seg", "ab")
+        self._index = open(base + ".idx", "ab")
+        self._prune()
+
+    def _prune(self):
+        segments = sorted(glob.glob(os.path.join(self.directory, "*.seg")))
+        for path in segments[:-self.max_segments]:
+            for suffix in (".seg", ".idx"):
+                try:
+                    os.remove(path[:-4] + suffix)
+                except OSError:
+                    pass
+
+    def append(self, source, url, payload, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        digest = hashlib.blake2b(payload, digest_size=16).digest()
+        with self._lock:
+            if self._last_digest.get(url) == digest:
+                return False
+            self._last_digest[url] = digest
+
+            if self._data is None or self._data.tell() >= self.segment_bytes:
+                self._open_segment(timestamp)
+
+            compressed = zlib.compress(payload, self.level)
+            source_bytes = (source or "").encode()
+            url_bytes = url.encode()
+            offset = self._data.tell()
+            self._data.write(RECORD_HEADER.pack(MAGIC, timestamp, len(source_bytes), len(url_bytes), len(compressed)))
+            self._data.write(source_bytes)
+            self._data.write(url_bytes)
+            self._data.write(compressed)
+            self._data.flush()
+            self._index.write(INDEX_ENTRY.pack(timestamp, offset, _url_key(url)))
+            self._index.flush()
+            return True
+
+    def close(self):
+        for f in (self._data, self._index):
+            if f is not None:
+                f.close()
+        self._data = self._index = None
+
+
+def read_record(data_file, offset):
+    """
+    (timestamp, source, url, payload) of the record at `offset`.
+    """
+    data_file.seek(offset)
+    magic, timestamp, source_len, url_len, size = RECORD_HEADER.unpack(data_file.read(RECORD_HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"corrupt archive record at offset {offset}")
+    source = data_file.read(source_len).decode()
+    url = data_file.read(url_len).decode()
+    return timestamp, source, url, zlib.decompress(data_file.read(size))
+
+
+class ArchivedResponse:
+    """
+    Minimal stand-in for requests.Response built from an archived payload.
+    """
+
+    def __init__(self, url, content, status_code=200):
+        self.url = url
+        self.content = content
+        self.status_code = status_code
+        self.headers = {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError(f"{self.status_code} (not in archive) for {self.url}", response=self)
+
+    def json(self):
+        import json
+        return json.loads(self.content)
+
+
+class ArchiveReader:
+    """
+    Time-indexed read access to an archive directory.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        # crc32(url) -> ([timestamps], [(segment path, offset)]) sorted by time
+        self._by_url = {}
+        self._files = {}
+        self._lock = threading.Lock()
+        self.start = self.end = None
+        for index_path in sorted(glob.glob(os.path.join(directory, "*.idx"))):
+            segment = index_path[:-4] + ".seg"
+            with open(index_path, "rb") as f:
+                raw = f.read()
+            usable = len(raw) - len(raw) % INDEX_ENTRY.size
+            for timestamp, offset, key in INDEX_ENTRY.iter_unpack(raw[:usable]):
+                times, locations = self._by_url.setdefault(key, ([], []))
+                position = bisect.bisect_right(times, timestamp)
+                times.insert(position, timestamp)
+                locations.insert(position, (segment, offset))
+                self.start = timestamp if self.start is None else min(self.start, timestamp)
+                self.end = timestamp if self.end is None else max(self.end, timestamp)
+
+    def lookup(self, url, at):
+        """
+        Payload of the latest record for `url` at or before `at`, or None.
+        """
+        entry = self._by_url.get(_url_key(url))
+        if entry is None:
+            return None
+        times, locations = entry
+        position = bisect.bisect_right(times, at) - 1
+        if position < 0:
+            return None
+        segment, offset = locations[position]
+        with self._lock:
+            f = self._files.get(segment)
+            if f is None:
+                f = self._files[segment] = open(segment, "rb")
+            _, _, record_url, payload = read_record(f, offset)
+        return payload if record_url == url else None
+
+    def records(self):
+        """
+        Iterate every (timestamp, source, url, payload) in time order.
+        """
+        entries = []
+        for times, locations in self._by_url.values():
+            entries.extend(zip(times, locations))
+        entries.sort()
+        for _, (segment, offset) in entries:
+            with open(segment, "rb") as f:
+                yield read_record(f, offset)
+
+
+class ArchiveReplay:
+    """
+    Serves archived payloads as HTTP responses on a virtual clock.
+    """
+
+    def __init__(self, directory, speed=1.0, start=None):
+        self.reader = ArchiveReader(directory)
+        if self.reader.start is None:
+            raise ValueError(f"no archived records in {directory}")
+        self.speed = speed
+        self.start = self.reader.start if start is None else start
+        clock.use_virtual(self.start, speed)
+
+    def get(self, url):
+        payload = self.reader.lookup(url, clock.now())
+        if payload is None:
+            return ArchivedResponse(url, b"", status_code=404)
+        return ArchivedResponse(url, payload)
+
+
+_writer = None
+_replay = None
+_configured = False
+_config_lock = threading.Lock()
+
+
+def _configure_from_env():
+    global _writer, _replay, _configured
+    with _config_lock:
+        if _configured:
+            return
+        # A bad PIDASH_REPLAY_DIR raises here on every call rather than once,
+        # so a failed replay never quietly turns into a live run
+        replay_dir = os.environ.get("PIDASH_REPLAY_DIR")
+        archive_dir = os.environ.get("PIDASH_ARCHIVE_DIR")
+        if replay_dir:
+            start = os.environ.get("PIDASH_REPLAY_START")
+            _replay = ArchiveReplay(
+                replay_dir,
+                speed=float(os.environ.get("PIDASH_REPLAY_SPEED", 1)),
+                start=float(start) if start else None,
+            )
+            logging.info(f"Replaying archive {replay_dir} from {_replay.start} at {_replay.speed}x")
+        elif archive_dir:
+            _writer = ArchiveWriter(archive_dir)
+            logging.info(f"Archiving upstream payloads to {archive_dir}")
+        _configured = True
+
+
+def active_writer():
+    _configure_from_env()
+    return _writer
+
+
+def active_replay():
+    _configure_from_env()
+    return _replay
+
+
+def start_recording(directory, **kwargs):
+    global _writer, _configured
+    with _config_lock:
+        _writer = ArchiveWriter(directory, **kwargs)
+        _configured = True
+    return _writer
+
+
+def start_replay(directory, speed=1.0, start=None):
+    global _replay, _configured
+    with _config_lock:
+        _replay = ArchiveReplay(directory, speed, start)
+        _configured = True
+    return _replay
@@ -0,0 +1,45 @@
+import datetime
+import time
+
+# Real wall clock by default; replay mode swaps in a virtual one that starts
+# at the archive's first record and runs at 1x or faster.
+_now = time.time
+_speed = 1.0
+
+
+def now():
+    """
+    Current epoch seconds (virtual while replaying an archive).
+    """
+    return _now()
+
+
+def datetime_now(tz=None):
+    return datetime.datetime.fromtimestamp(_now(), tz)
+
+
+def speed():
+    return _speed
+
+
+def sleep(seconds):
+    """
+    Sleep `seconds` of dashboard time, i.e. shorter when replay is accelerated.
+    """
+    time.sleep(seconds / _speed)
+
+
+def use_virtual(start, speed=1.0):
+    """
+    Run the clock from epoch `start`, advancing `speed` times faster than real time.
+    """
+    global _now, _speed
+    real_start = time.time()
+    _now = lambda: start + (time.time() - real_start) * speed
+    _speed = speed
+
+
+def use_real():
+    global _now, _speed
+    _now = time.time
+    _speed = 1.0
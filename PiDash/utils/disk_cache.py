@@ -0,0 +1,131 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_DIR = os.environ.get("PIDASH_CACHE_DIR", os.path.expanduser("~/.cache/pidash"))
+CACHE_PATH = os.path.join(CACHE_DIR, "cache.sqlite")
+
+# Bump when the shape of any cached value changes; older rows are then
+# treated as misses instead of being handed to code that can't read them.
+CACHE_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    expires_at REAL,
+    value TEXT NOT NULL
+)
+"""
+
+
+class DiskCache:
+    """
+    Small persistent key -> JSON value store with per-entry TTL and version.
+
+    One SQLite file in WAL mode: each write is a single-row transaction, so
+    a power cut on the Pi loses at most the last write, never the file.
+    Wall-clock time is used (not utils.clock) because entries outlive the
+    process.
+
+    If the file can't be opened (missing or read-only directory) that is
+    logged once and every call behaves as a miss / no-op, so the dashboard
+    runs without a disk cache rather than failing.
+    """
+
+    def __init__(self, path=CACHE_PATH, version=CACHE_VERSION):
+        self.path = path
+        self.version = version
+        self._db = None
+        self._unavailable = False
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Call with `_lock` held. None if the cache can't be opened.
+        if self._db is None and not self._unavailable:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute("PRAGMA synchronous=NORMAL")
+                db.execute(SCHEMA)
+            except (OSError, sqlite3.Error) as e:
+                logging.error(f"Disk cache {self.path} unavailable, running without it: {e}")
+                self._unavailable = True
+                return None
+            self._db = db
+        return self._db
+
+    def get(self, key, max_age=None):
+        """
+        Returns:
+            tuple: (value, stored_at), or None if missing, expired, older than
+            `max_age` seconds, or written by another cache version.
+        """
+        try:
+            with self._lock:
+                db = self._connect()
+                if db is None:
+                    return None
+                row = db.execute(
+                    "SELECT value, stored_at, expires_at FROM entries WHERE key = ? AND version = ?",
+                    (key, self.version),
+                ).fetchone()
+        except (OSError, sqlite3.Error) as e:
+            logging.error(f"Disk cache read of {key} failed: {e}")
+            return None
+        if row is None:
+            return None
+        value, stored_at, expires_at = row
+        now = time.time()
+        if expires_at is not None and expires_at <= now:
+            return None
+        if max_age is not None and now - stored_at > max_age:
+            return None
+        return json.loads(value), stored_at
+
+    def set(self, key, value, ttl=None, stored_at=None):
+        stored_at = time.time() if stored_at is None else stored_at
+        expires_at = stored_at + ttl if ttl is not None else None
+        try:
+            data = json.dumps(value)
+            with self._lock:
+                db = self._connect()
+                if db is not None:
+                    db.execute(
+                        "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                        (key, self.version, stored_at, expires_at, data),
+                    )
+        except (TypeError, ValueError, OSError, sqlite3.Error) as e:
+            logging.error(f"Disk cache write of {key} failed: {e}")
+
+    def delete(self, key):
+        try:
+            with self._lock:
+                db = self._connect()
+                if db is not None:
+                    db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        except (OSError, sqlite3.Error) as e:
+            logging.error(f"Disk cache delete of {key} failed: {e}")
+
+    def purge(self):
+        """
+        Drop expired rows and rows from other cache versions.
+        """
+        try:
+            with self._lock:
+                db = self._connect()
+                if db is not None:
+                    db.execute(
+                        "DELETE FROM entries WHERE version != ? OR expires_at <= ?",
+                        (self.version, time.time()),
+                    )
+        except (OSError, sqlite3.Error) as e:
+            logging.error(f"Disk cache purge failed: {e}")
+
+
+cache = DiskCache()
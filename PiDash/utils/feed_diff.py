@@ -0,0 +1,192 @@
+import itertools
+import threading
+from dataclasses import dataclass
+
+# FeedHeader.Incrementality values from proto/gtfs-realtime.proto
+FULL_DATASET = 0
+DIFFERENTIAL = 1
+
+# Tracker versions, unique across trackers so a consumer that outlives
+# one (e.g. after the feed state is reset) never mistakes it for another
+_versions = itertools.count(1)
+
+
+@dataclass(frozen=True)
+class FeedEvent:
+    """
+    One change between two consecutive versions of a feed.
+
+    kind:      trip_added / trip_removed / trip_changed,
+               alert_added / alert_expired / alert_changed
+    key:       trip_id for trips, alert (entity) id for alerts
+    entity_id: FeedEntity.id for alerts ("" for trips, which the index keys
+               by trip_id)
+    stops:     for trips, ((stop_id, old_time, new_time), ...) for every stop
+               whose predicted time was added, removed (None) or moved; an
+               added trip lists all its stops with old_time None, a removed
+               one with new_time None
+    route_id:  route of the trip
+    """
+    kind: str
+    key: str
+    entity_id: str
+    stops: tuple = ()
+    route_id: str = ""
+
+
+def _stop_changes(old_times, new_times):
+    return tuple(
+        (stop_id, old_times.get(stop_id), new_times.get(stop_id))
+        for stop_id in dict.fromkeys([*old_times, *new_times])
+        if old_times.get(stop_id) != new_times.get(stop_id)
+    )
+
+
+class FeedTracker:
+    """
+    Materialized entity set for one DIFFERENTIAL feed.
+
+    FULL_DATASET messages replace the set; DIFFERENTIAL messages are applied
+    on top of it (entities replace by id, is_deleted removes), so extractors
+    always see every live entity rather than just the latest delta. What
+    changed is worked out later from the extracted indexes (TripTracker,
+    AlertTracker), the same way as for FULL_DATASET feeds.
+    """
+
+    def __init__(self):
+        # entity id -> FeedEntity
+        self.entities = {}
+        self.header = None
+        self.incrementality = FULL_DATASET
+        self._message = None
+        self._lock = threading.Lock()
+
+    def update(self, feed):
+        """
+        Apply one decoded FeedMessage.
+        """
+        with self._lock:
+            if feed.header.incrementality == DIFFERENTIAL:
+                current = dict(self.entities)
+                for entity in feed.entity:
+                    if entity.is_deleted:
+                        current.pop(entity.id, None)
+                    else:
+                        current[entity.id] = entity
+            else:
+                current = {entity.id: entity for entity in feed.entity}
+            self.entities = current
+            self.header = feed.header
+            self.incrementality = feed.header.incrementality
+            self._message = feed if self.incrementality == FULL_DATASET else None
+
+    def message(self):
+        """
+        The current entity set as a FULL_DATASET FeedMessage (what extractors
+        such as build_stop_index expect), rebuilt only after DIFFERENTIAL updates.
+        """
+        with self._lock:
+            if self._message is None and self.header is not None:
+                from google.transit import gtfs_realtime_pb2
+                feed = gtfs_realtime_pb2.FeedMessage()
+                feed.header.CopyFrom(self.header)
+                feed.header.incrementality = FULL_DATASET
+                for entity in self.entities.values():
+                    feed.entity.add().CopyFrom(entity)
+                self._message = feed
+            return self._message
+
+
+class IndexTracker:
+    """
+    Events between consecutive indexes extracted from one feed.
+
+    Works from the index alone, so feeds indexed by the wire reader are
+    diffed without ever being decoded into protobuf messages. Subclasses
+    say what an index holds (`entries`) and how two entries differ (`diff`).
+    """
+
+    def __init__(self):
+        # key -> entry, as returned by entries() for the last index
+        self.entries_seen = {}
+        self.index = None
+        # Set by every update; `events` turn the index at `base` into `index`
+        self.base = None
+        self.version = None
+        self.events = ()
+
+    def entries(self, index):
+        raise NotImplementedError
+
+    def diff(self, key, old, new):
+        """
+        FeedEvent for one key (old or new is None when it was added or
+        removed), or None if nothing worth reporting changed.
+        """
+        raise NotImplementedError
+
+    def update(self, index):
+        """
+        Diff `index` against the previous one (everything is added the first
+        time).
+
+        Returns:
+            tuple: FeedEvent for every entry added, removed or changed.
+        """
+        previous = self.entries_seen
+        current = self.entries(index)
+        events = []
+        for key, entry in current.items():
+            old = previous.get(key)
+            if old != entry:
+                events.append(self.diff(key, old, entry))
+        for key, entry in previous.items():
+            if key not in current:
+                events.append(self.diff(key, entry, None))
+
+        self.entries_seen = current
+        self.index = index
+        self.base = self.version
+        self.version = next(_versions)
+        self.events = tuple(event for event in events if event is not None)
+        return self.events
+
+
+class TripTracker(IndexTracker):
+    """
+    Trip events between consecutive StopIndexes. Only stops with a
+    predicted arrival are compared, as those are all the index keeps.
+    """
+
+    def entries(self, index):
+        # trip_id -> (route_id, {stop_id: arrival epoch})
+        routes = {}
+        for rows in index.by_stop.values():
+            for _, trip_id, route_id in rows:
+                routes[trip_id] = route_id
+        return {trip_id: (routes.get(trip_id, ""), dict(stops)) for trip_id, stops in index.trips.items()}
+
+    def diff(self, trip_id, old, new):
+        if old is None:
+            return FeedEvent("trip_added", trip_id, "", _stop_changes({}, new[1]), new[0])
+        if new is None:
+            return FeedEvent("trip_removed", trip_id, "", _stop_changes(old[1], {}), old[0])
+        return FeedEvent("trip_changed", trip_id, "", _stop_changes(old[1], new[1]), new[0])
+
+
+class AlertTracker(IndexTracker):
+    """
+    Alert events between consecutive AlertIndexes. Alerts leave the feed
+    when they expire; any change to text, routes or active periods is a
+    change.
+    """
+
+    def entries(self, index):
+        return index.alerts
+
+    def diff(self, alert_id, old, new):
+        if old is None:
+            return FeedEvent("alert_added", alert_id, alert_id)
+        if new is None:
+            return FeedEvent("alert_expired", alert_id, alert_id)
+        return FeedEvent("alert_changed", alert_id, alert_id)
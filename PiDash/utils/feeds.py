@@ -0,0 +1,423 @@
+import hashlib
+import logging
+import threading
+import os
+from concurrent.futures import BrokenExecutor, ThreadPoolExecutor
+
+from utils import history, http, memwatch, wire
+from utils.feed_diff import DIFFERENTIAL, FULL_DATASET, AlertTracker, FeedTracker, TripTracker
+from utils.metrics import metrics, sampled_log
+from utils.stop_index import StopIndex, build_stop_index, build_stop_index_from_wire
+
+MTA_FEED_BASE = "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/"
+
+# Subway GTFS-realtime feeds, by short name
+FEED_PATHS = {
+    "1234567": "nyct%2Fgtfs",
+    "ace": "nyct%2Fgtfs-ace",
+    "bdfm": "nyct%2Fgtfs-bdfm",
+    "g": "nyct%2Fgtfs-g",
+    "jz": "nyct%2Fgtfs-jz",
+    "nqrw": "nyct%2Fgtfs-nqrw",
+    "l": "nyct%2Fgtfs-l",
+    "si": "nyct%2Fgtfs-si",
+    "alerts": "camsys%2Fsubway-alerts",
+}
+
+# route_id -> feed that carries its trip updates
+ROUTE_FEEDS = {
+    **{route: "1234567" for route in ("1", "2", "3", "4", "5", "6", "6X", "7", "7X", "GS")},
+    **{route: "ace" for route in ("A", "C", "E", "H", "FS")},
+    **{route: "bdfm" for route in ("B", "D", "F", "FX", "M")},
+    "G": "g",
+    "J": "jz",
+    "Z": "jz",
+    **{route: "nqrw" for route in ("N", "Q", "R", "W")},
+    "L": "l",
+    "SI": "si",
+}
+
+
+def feed_url(name):
+    return MTA_FEED_BASE + FEED_PATHS[name]
+
+
+def feed_urls_for_routes(routes):
+    """
+    Distinct feed URLs needed to cover `routes`, e.g. ("L", "G", "J", "M").
+    """
+    urls = []
+    for route in routes:
+        url = feed_url(ROUTE_FEEDS[route.upper()])
+        if url not in urls:
+            urls.append(url)
+    return urls
+
+
+L_FEED_URL = feed_url("l")
+ALERTS_FEED_URL = feed_url("alerts")
+
+# Feeds larger than this are decoded in a worker process (0 disables it).
+# The L feed is small enough that shipping bytes to another process costs
+# more than it saves; ACE/1234567 are several times larger.
+PROCESS_DECODE_MIN_BYTES = int(os.environ.get("PIDASH_PROCESS_DECODE_MIN_BYTES", 256 * 1024))
+PROCESS_DECODE_WORKERS = min(2, os.cpu_count() or 1)
+
+# How trip-update feeds are indexed: "wire" reads only the fields StopIndex
+# needs straight from the bytes; "protobuf" does a full ParseFromString.
+# With the pure-Python protobuf backend the wire reader is ~3x faster.
+DECODER = os.environ.get("PIDASH_DECODER", "wire")
+
+_fetch_executor = ThreadPoolExecutor(max_workers=len(FEED_PATHS), thread_name_prefix="feed")
+_decode_executor = None
+_decode_executor_lock = threading.Lock()
+
+
+class FeedState:
+    """
+    Last decoded copy of one GTFS-realtime feed plus everything needed to
+    tell whether the next download is actually new.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.etag = None
+        self.last_modified = None
+        self.digest = None
+        self.header_timestamp = None
+        self.content = None
+        self.feed = None
+        self.version = 0
+        # Extracted results keyed by the caller, dropped whenever the feed changes
+        self.results = {}
+        # Merged entity set, created once the feed turns out to be DIFFERENTIAL
+        self.tracker = None
+        # Diff consecutive extracted indexes, by kind; see trip_events()/alert_events()
+        self.index_trackers = {}
+        self.lock = threading.Lock()
+
+    def message(self):
+        """
+        The decoded FeedMessage, parsed on first use for this version.
+        Call with `lock` held.
+        """
+        if self.feed is None and self.content is not None:
+            feed = _pb2().FeedMessage()
+            with metrics.timer("parse_seconds", feed=http.endpoint_name(self.url)):
+                feed.ParseFromString(self.content)
+            self.feed = feed
+        return self.feed
+
+
+_states = {}
+_states_lock = threading.Lock()
+
+
+def _pb2():
+    # The generated bindings pull in all of protobuf; load them on first decode
+    # rather than at import so the dashboard starts painting sooner on a Pi.
+    from google.transit import gtfs_realtime_pb2
+    return gtfs_realtime_pb2
+
+
+def _state_for(url):
+    with _states_lock:
+        state = _states.get(url)
+        if state is None:
+            state = _states[url] = FeedState(url)
+        return state
+
+
+def _purge_decoded():
+    # Decoded FeedMessages are the bulk of a feed's memory and are re-parsed
+    # from `content` on demand. The stop index stays: rebuilding it would
+    # record the same version in the feed history twice.
+    with _states_lock:
+        states = list(_states.values())
+    for state in states:
+        with state.lock:
+            if state.tracker is not None and state.tracker.incrementality == DIFFERENTIAL:
+                continue
+            state.feed = None
+            state.results = {key: value for key, value in state.results.items() if key == "stop_index"}
+
+
+memwatch.register_purge("feeds", _purge_decoded)
+
+
+def _unchanged(name, reason):
+    metrics.inc("feed_cache", feed=name, result=reason)
+    sampled_log(logging.getLogger(__name__), logging.DEBUG, f"Feed {name} unchanged ({reason})", every=100)
+
+
+def fetch_feed(url, timeout=None):
+    """
+    Download a GTFS-realtime feed, keeping the previous version if unchanged.
+
+    Change detection, cheapest first:
+      1. conditional GET (ETag / If-Modified-Since) -> 304 Not Modified
+      2. hash of the raw bytes
+      3. FeedHeader.timestamp peeked from the wire
+
+    Returns:
+        FeedState: state holding the latest raw feed (decoded lazily by
+        `message()`) whose `version` only increments when the content
+        really changed.
+    """
+    state = _state_for(url)
+    name = http.endpoint_name(url)
+    with state.lock:
+        headers = {}
+        if state.content is not None:
+            if state.etag:
+                headers["If-None-Match"] = state.etag
+            if state.last_modified:
+                headers["If-Modified-Since"] = state.last_modified
+
+        response = http.get(url, source="mta", headers=headers, timeout=timeout)
+        if response.status_code == 304 and state.content is not None:
+            _unchanged(name, "not_modified")
+            return state
+        response.raise_for_status()
+
+        state.etag = response.headers.get("ETag")
+        state.last_modified = response.headers.get("Last-Modified")
+
+        content = response.content
+        digest = hashlib.blake2b(content, digest_size=16).digest()
+        if state.content is not None and digest == state.digest:
+            _unchanged(name, "same_hash")
+            return state
+
+        try:
+            header_timestamp = wire.header_timestamp(content) or None
+            incrementality = wire.header_incrementality(content)
+        except (ValueError, IndexError):
+            # Not a readable FeedMessage; the hash above still tells versions apart
+            header_timestamp, incrementality = None, FULL_DATASET
+        if state.content is not None and header_timestamp and header_timestamp == state.header_timestamp:
+            _unchanged(name, "same_header_timestamp")
+            state.digest = digest
+            return state
+
+        metrics.inc("feed_cache", feed=name, result="changed")
+        state.content = content
+        state.feed = None
+        state.digest = digest
+        state.header_timestamp = header_timestamp
+        state.version += 1
+        state.results = {}
+        if state.tracker is None and incrementality == DIFFERENTIAL:
+            state.tracker = FeedTracker()
+        if state.tracker is not None:
+            _apply_tracker(state)
+        return state
+
+
+def _apply_tracker(state):
+    # A DIFFERENTIAL message only carries what changed, so every version is
+    # merged on arrival; none may be skipped. Call with `lock` held.
+    message = state.message()
+    with metrics.timer("merge_seconds", feed=http.endpoint_name(state.url)):
+        state.tracker.update(message)
+    if state.tracker.incrementality == DIFFERENTIAL:
+        # Extractors always see the whole entity set, not just this delta
+        state.feed = state.tracker.message()
+
+
+def _index_events(url, index, kind, tracker_class):
+    state = _state_for(url)
+    name = http.endpoint_name(url)
+    with state.lock:
+        tracker = state.index_trackers.get(kind)
+        if tracker is None:
+            tracker = state.index_trackers[kind] = tracker_class()
+        if index is not tracker.index:
+            with metrics.timer("diff_seconds", feed=name):
+                tracker.update(index)
+            for event in tracker.events:
+                metrics.inc("feed_events", feed=name, kind=event.kind)
+        return tracker.base, tracker.version, tracker.events, tracker.index
+
+
+def trip_events(url, index):
+    """
+    What changed in `url`'s trips between the previous stop index passed
+    here and `index` (normally the one get_stop_index just returned).
+
+    The diff runs once per index however many callers ask, and works on
+    the index rather than the FeedMessage, so the wire decoder path stays
+    free of protobuf. The first call reports every trip as added.
+
+    Returns:
+        tuple: (base, version, (FeedEvent, ...), StopIndex). The events turn
+        the index seen at `base` into the returned one at `version`; callers
+        holding anything other than `base` should rebuild from the index.
+    """
+    return _index_events(url, index, "trips", TripTracker)
+
+
+def alert_events(url, index):
+    """
+    Same as trip_events for an alerts feed's AlertIndex: alert_added,
+    alert_expired and alert_changed events.
+    """
+    return _index_events(url, index, "alerts", AlertTracker)
+
+
+def get_extracted(url, key, extract, timeout=None):
+    """
+    Return `extract(feed)` for the latest version of `url`.
+
+    The extracted value is memoized per feed version under `key`, so an
+    unchanged feed short-circuits to the previous result without re-decoding
+    or re-scanning entities.
+    """
+    state = fetch_feed(url, timeout=timeout)
+    with state.lock:
+        if key not in state.results:
+            state.results[key] = extract(state.message())
+        return state.results[key]
+
+
+def _index_from_bytes(content):
+    # Runs in a worker process: decode and return only the picklable index
+    if DECODER == "wire":
+        return build_stop_index_from_wire(content)
+    feed = _pb2().FeedMessage()
+    feed.ParseFromString(content)
+    return build_stop_index(feed)
+
+
+def _get_decode_executor():
+    global _decode_executor
+    with _decode_executor_lock:
+        if _decode_executor is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # spawn, not fork: the parent already runs refresher/HTTP threads
+            _decode_executor = ProcessPoolExecutor(
+                max_workers=PROCESS_DECODE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _decode_executor
+
+
+def _reset_decode_executor():
+    global _decode_executor
+    with _decode_executor_lock:
+        executor, _decode_executor = _decode_executor, None
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+def get_stop_index(url=L_FEED_URL, timeout=None):
+    """
+    StopIndex for the latest version of a trip-update feed, built once per
+    feed version and shared by every station/direction lookup.
+
+    Large feeds are decoded in a worker process so the render thread (and
+    the GIL) stay free; small ones are decoded in-thread.
+    """
+    state = fetch_feed(url, timeout=timeout)
+    with state.lock:
+        index = state.results.get("stop_index")
+        if index is not None:
+            return index
+        content = state.content
+        version = state.version
+        offload = (
+            # A DIFFERENTIAL feed's bytes are only a delta; index the tracked set
+            not (state.tracker is not None and state.tracker.incrementality == DIFFERENTIAL)
+            and PROCESS_DECODE_MIN_BYTES
+            and PROCESS_DECODE_WORKERS > 1
+            and len(content) >= PROCESS_DECODE_MIN_BYTES
+        )
+        if not offload:
+            with metrics.timer("index_seconds", feed=http.endpoint_name(url)):
+                index = state.results["stop_index"] = _build_index(state)
+            history.record(url, index)
+            return index
+
+    try:
+        with metrics.timer("parse_seconds", feed=http.endpoint_name(url), where="process"):
+            index = _get_decode_executor().submit(_index_from_bytes, content).result()
+    except BrokenExecutor as e:
+        # A dead worker poisons the pool; drop it and decode in-thread instead
+        logging.error(f"Decode worker failed, decoding in-thread: {e}")
+        _reset_decode_executor()
+        with state.lock:
+            index = state.results.get("stop_index")
+            if index is None:
+                index = state.results["stop_index"] = _build_index(state)
+                history.record(url, index)
+            return index
+    with state.lock:
+        if state.version == version and "stop_index" not in state.results:
+            state.results["stop_index"] = index
+            history.record(url, index)
+    return index
+
+
+def _build_index(state, stop_ids=None):
+    # Call with `lock` held
+    differential = state.tracker is not None and state.tracker.incrementality == DIFFERENTIAL
+    if DECODER == "wire" and state.feed is None and not differential:
+        return build_stop_index_from_wire(state.content, stop_ids)
+    # Already decoded, protobuf requested, or only the tracked entity set is complete
+    index = build_stop_index(state.message())
+    return index if stop_ids is None else _restrict(index, stop_ids)
+
+
+def _restrict(index, stop_ids):
+    return StopIndex(
+        {stop_id: index.by_stop[stop_id] for stop_id in stop_ids if stop_id in index.by_stop},
+        {
+            trip_id: tuple(stop for stop in stops if stop[0] in stop_ids)
+            for trip_id, stops in index.trips.items()
+        },
+        index.timestamp,
+    )
+
+
+def get_stop_times(url, stop_ids, timeout=None):
+    """
+    StopIndex covering only `stop_ids`, for callers that need one station.
+
+    Reuses the full index if some other caller already built it for this
+    feed version; otherwise only entities mentioning these stops are read.
+    """
+    stop_ids = frozenset(stop_ids)
+    state = fetch_feed(url, timeout=timeout)
+    with state.lock:
+        index = state.results.get("stop_index")
+        if index is not None:
+            return index
+        key = ("stop_index", stop_ids)
+        if key not in state.results:
+            with metrics.timer("index_seconds", feed=http.endpoint_name(url), stops="selected"):
+                state.results[key] = _build_index(state, stop_ids)
+        return state.results[key]
+
+
+def get_stop_indexes(urls, timeout=None):
+    """
+    Fetch and index several feeds concurrently.
+
+    Returns:
+        dict: url -> StopIndex. Feeds that failed are logged and left out;
+        if every feed failed the last error is raised. Total latency tracks
+        the slowest feed rather than the sum.
+    """
+    futures = {url: _fetch_executor.submit(get_stop_index, url, timeout) for url in urls}
+    indexes = {}
+    error = None
+    for url, future in futures.items():
+        try:
+            indexes[url] = future.result()
+        except Exception as e:
+            logging.error(f"Feed fetch failed for {url}: {e}")
+            error = e
+    if error is not None and not indexes:
+        raise error
+    return indexes
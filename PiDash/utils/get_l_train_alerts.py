@@ -1,52 +1,68 @@
-from google.transit import gtfs_realtime_pb2
-import requests
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
+import logging
 import pytz
 
+from utils import clock, mta
+from utils.alert_index import build_alert_index
+from utils.feeds import ALERTS_FEED_URL, alert_events, get_extracted
+
+NYC = pytz.timezone("America/New_York")
+
+
 def get_l_train_alerts(latest_only=False, route_filter="L"):
-    url = "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/camsys%2Fsubway-alerts"
-    feed = gtfs_realtime_pb2.FeedMessage()
     try:
-        r = requests.get(url, timeout=5)
-        r.raise_for_status()
-        feed.ParseFromString(r.content)
-
-        alerts = []
-        for entity in feed.entity:
-            if entity.alert:
-                header = entity.alert.header_text.translation[0].text if entity.alert.header_text.translation else ""
-                desc = entity.alert.description_text.translation[0].text if entity.alert.description_text.translation else ""
-                informed_routes = [info.route_id for info in entity.alert.informed_entity if info.route_id]
-                if route_filter in informed_routes and (header or desc):
-                    timestamp = entity.alert.active_period[0].start if entity.alert.active_period else 0
-                    formatted_alert = f"""
- {header}
- <br>
- @{datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S') if timestamp else 'N/A'}
-
-"""
-                    alerts.append({
-                        "header": header,
-                        "description": desc,
-                        "timestamp": timestamp,
-                        "formatted": formatted_alert
-                    })
-
-        # Filter alerts to only include those for today and tomorrow (New York time)
-        nyc_now = datetime.now(pytz.timezone("America/New_York"))
-        nyc_today = nyc_now.date()
-        nyc_tomorrow = nyc_today + timedelta(days=1)
-
-        filtered_alerts = [
-            alert for alert in alerts
-            if nyc_today <= datetime.fromtimestamp(alert["timestamp"], pytz.timezone("America/New_York")).date() <= nyc_tomorrow
-        ]
-
-        # Sort filtered alerts by timestamp (descending) and return the latest one if latest_only is True
-        filtered_alerts.sort(key=lambda x: x["timestamp"], reverse=True)
-        if latest_only:
-            return [filtered_alerts[0]["formatted"], filtered_alerts[1]["formatted"]] if filtered_alerts else []
-        return [alert["formatted"] for alert in filtered_alerts]
+        return fetch_l_train_alerts(latest_only, route_filter)
     except Exception as e:
-        print("Error fetching alerts:", e)
+        logging.error(f"Error fetching alerts: {e}")
         return []
+
+
+def get_alert_index(timeout=None):
+    """
+    AlertIndex for the current alerts feed, rebuilt only when the feed changes.
+    """
+    return get_extracted(ALERTS_FEED_URL, "alert_index", build_alert_index, timeout=timeout)
+
+
+def get_alert_events(timeout=None):
+    """
+    What changed in the alerts feed since the previous call's index.
+
+    Returns:
+        tuple: (base, version, (FeedEvent, ...), AlertIndex), as feeds.alert_events.
+    """
+    return alert_events(ALERTS_FEED_URL, get_alert_index(timeout=timeout))
+
+
+def _today_and_tomorrow():
+    # [start of today, end of tomorrow) in New York time, as epochs
+    nyc_today = clock.datetime_now(NYC).date()
+    start = NYC.localize(datetime.combine(nyc_today, time()))
+    end = NYC.localize(datetime.combine(nyc_today + timedelta(days=2), time()))
+    return int(start.timestamp()), int(end.timestamp()) - 1
+
+
+def fetch_l_train_alerts(latest_only=False, route_filter="L"):
+    """
+    Same as get_l_train_alerts, but raises on failure instead of returning [].
+
+    Args:
+        latest_only (bool): Only the two most recent alerts.
+        route_filter (str or iterable): Route id(s) to show alerts for.
+
+    Returns:
+        list: [Alert, ...] active at any point today or tomorrow (New York
+        time), newest first. Formatting is left to utils.render.
+    """
+    t0, t1 = _today_and_tomorrow()
+    base, _, events, index = get_alert_events()
+    for event in events:
+        # The first diff lists every alert as added; only report real changes
+        if base is not None and event.kind != "alert_changed":
+            logging.info(f"Service alert {event.key} {event.kind.removeprefix('alert_')}")
+    alerts = index.query(route_filter, t0, t1)
+    alerts = alerts[:2] if latest_only else alerts
+    if mta.LLM_SUMMARIES and alerts:
+        # Cached per alert text, so only new/changed alerts reach the model
+        alerts = mta.summarize_alerts(alerts)
+    return alerts
@@ -1,9 +1,16 @@
-from google.transit import gtfs_realtime_pb2
-import requests, datetime
+import requests
+import heapq
 import logging
+import threading
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+from utils import clock, schedule
+from utils.feeds import feed_urls_for_routes, get_stop_indexes, trip_events
+from utils.metrics import metrics
+from utils.models import Arrival, from_json
+
+# (feed url, stop ids) -> ArrivalBoard
+_boards = {}
+_boards_lock = threading.Lock()
 
 def get_l_train_arrivals(stop_ids=["L15S", "L15N"]):
     """
@@ -13,39 +20,157 @@ def get_l_train_arrivals(stop_ids=["L15S", "L15N"]):
         stop_ids (list): List of stop IDs to fetch arrivals for.
 
     Returns:
-        dict: A dictionary where keys are stop IDs and values are lists of arrival details.
+        dict: stop ID -> [Arrival, ...] in time order.
     """
-    
-    url = "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-l"
+    return get_arrivals(stop_ids, routes=("L",))
+
+
+def get_arrivals(stop_ids, routes=("L",)):
+    """
+    Fetch arrival times for stops served by any mix of subway lines.
+
+    Every feed needed for `routes` is fetched concurrently; arrivals at a
+    stop that appears in more than one feed are merged in time order.
 
-    feed = gtfs_realtime_pb2.FeedMessage()
+    Args:
+        stop_ids (list): List of stop IDs to fetch arrivals for.
+        routes (tuple): Route IDs on the board, e.g. ("L", "G", "J", "M").
+
+    Returns:
+        dict: stop ID -> [Arrival, ...] in time order. Arrivals keep their
+        epoch; minutes are worked out when they are drawn.
+    """
     try:
-        logging.debug("Fetching GTFS Realtime feed...")
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        logging.debug(f"Raw GTFS feed response: {response.content[:500]}...")  # Log first 500 bytes of the response
-        feed.ParseFromString(response.content)
-
-        arrivals = {stop_id: [] for stop_id in stop_ids}
-        logging.debug(f"Processing stop IDs: {stop_ids}")
-        for entity in feed.entity:
-            if entity.HasField("trip_update"):
-                trip_id = entity.trip_update.trip.trip_id
-                route_id = entity.trip_update.trip.route_id
-                for update in entity.trip_update.stop_time_update:
-                    if update.stop_id in stop_ids and update.arrival.time:
-                        arrival_time = datetime.datetime.fromtimestamp(update.arrival.time)
-                        minutes = int((arrival_time - datetime.datetime.now()).total_seconds() // 60)
-                        if minutes >= 0:
-                            arrivals[update.stop_id].append({
-                                "minutes": minutes +3,
-                                "trip_id": trip_id,
-                                "route_id": route_id,
-                                "arrival_time": arrival_time.strftime("%Y-%m-%d %H:%M:%S"),
-                            })
-        return arrivals
+        return fetch_arrivals(stop_ids, routes)
     except requests.exceptions.RequestException as e:
         logging.error(f"Request error: {e}")
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
-    return {stop_id: [] for stop_id in stop_ids}
+    # Realtime is down: show the timetable rather than nothing
+    now = clock.now()
+    return {stop_id: scheduled_arrivals(stop_id, now) for stop_id in stop_ids}
+
+
+def _arrival(timestamp, trip_id, route_id, now, scheduled=False):
+    # Trains that have already left are dropped (None)
+    arrival = Arrival(timestamp, trip_id, route_id, scheduled)
+    return arrival if arrival.minutes(now) is not None else None
+
+
+def restore_arrivals(arrivals, now=None):
+    """
+    Rebuild Arrival records saved with models.to_json (e.g. in the disk
+    cache), dropping trains that have left since.
+    """
+    now = clock.now() if now is None else now
+    restored = {}
+    for stop_id, rows in arrivals.items():
+        records = (from_json(Arrival, row) for row in rows)
+        restored[stop_id] = [arrival for arrival in records if arrival.minutes(now) is not None]
+    return restored
+
+
+def scheduled_arrivals(stop_id, now=None, limit=3):
+    """
+    Arrivals from the static GTFS timetable, flagged `scheduled` (empty if
+    no schedule is configured).
+    """
+    now = clock.now() if now is None else now
+    rows = schedule.next_departures(stop_id, after=int(now), limit=limit)
+    return [arrival for arrival in (_arrival(*row, now, scheduled=True) for row in rows) if arrival]
+
+
+class ArrivalBoard:
+    """
+    Arrivals at a few stops from one trip feed, kept current by applying
+    the feed's trip events (see feeds.trip_events) instead of re-reading
+    the whole stop index every refresh.
+    """
+
+    def __init__(self, stop_ids):
+        self.stop_ids = frozenset(stop_ids)
+        # stop_id -> {trip_id: (arrival epoch, route_id)}
+        self.rows = {}
+        self.version = None
+        self.lock = threading.Lock()
+
+    def update(self, base, version, events, index):
+        """
+        Catch up to `version`: apply the events if the board is at `base`,
+        otherwise (first use, or a version was missed) reload from `index`.
+
+        Returns:
+            str: "current", "applied" or "reloaded".
+        """
+        with self.lock:
+            if self.version == version:
+                return "current"
+            if self.version is not None and self.version == base:
+                for event in events:
+                    for stop_id, _, timestamp in event.stops:
+                        rows = self.rows.get(stop_id)
+                        if rows is None:
+                            continue
+                        if timestamp is None:
+                            rows.pop(event.key, None)
+                        else:
+                            rows[event.key] = (timestamp, event.route_id)
+                result = "applied"
+            else:
+                self.rows = {
+                    stop_id: {trip_id: (timestamp, route_id) for timestamp, trip_id, route_id in index.arrivals(stop_id)}
+                    for stop_id in self.stop_ids
+                }
+                result = "reloaded"
+            self.version = version
+            return result
+
+    def arrivals(self, stop_id, after=None):
+        """
+        [(arrival epoch, trip_id, route_id), ...] in time order, like StopIndex.arrivals.
+        """
+        with self.lock:
+            rows = self.rows.get(stop_id, {})
+            return sorted(
+                (timestamp, trip_id, route_id)
+                for trip_id, (timestamp, route_id) in rows.items()
+                if after is None or timestamp >= after
+            )
+
+
+def _board(url, stop_ids):
+    key = (url, frozenset(stop_ids))
+    with _boards_lock:
+        board = _boards.get(key)
+        if board is None:
+            board = _boards[key] = ArrivalBoard(stop_ids)
+        return board
+
+
+def fetch_arrivals(stop_ids, routes=("L",)):
+    """
+    Same as get_arrivals, but raises on failure instead of returning empty
+    lists, so callers can tell "no trains" from "feed unavailable".
+    """
+    indexes = get_stop_indexes(feed_urls_for_routes(routes))
+
+    boards = []
+    for url, index in indexes.items():
+        board = _board(url, stop_ids)
+        result = board.update(*trip_events(url, index))
+        metrics.inc("arrival_board_updates", result=result)
+        boards.append(board)
+
+    arrivals = {stop_id: [] for stop_id in stop_ids}
+    now = clock.now()
+    after = int(now)
+    for stop_id in stop_ids:
+        rows = heapq.merge(*(board.arrivals(stop_id, after=after) for board in boards))
+        for row in rows:
+            arrival = _arrival(*row, now)
+            if arrival:
+                arrivals[stop_id].append(arrival)
+        if not arrivals[stop_id]:
+            # Feed is up but has nothing for this stop (e.g. a trip gap overnight)
+            arrivals[stop_id] = scheduled_arrivals(stop_id, now)
+    return arrivals
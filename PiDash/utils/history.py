@@ -0,0 +1,233 @@
+import hashlib
+import logging
+import threading
+
+from utils import clock
+
+# One hour of history at the 15 s poll interval. Each L-feed snapshot is
+# ~1-2k rows x 3 int64 columns, so a full buffer stays in the low MB no
+# matter how long the dashboard runs.
+CAPACITY = 240
+
+_np = None
+
+
+def _numpy():
+    # numpy is only needed once history is recorded; keep it off the import path
+    global _np
+    if _np is None:
+        import numpy
+        _np = numpy
+    return _np
+
+
+def code(identifier):
+    """
+    Stable 64-bit integer code for a trip/stop id, so columns are plain
+    int64 arrays and no ever-growing string intern table is needed.
+    """
+    return int.from_bytes(hashlib.blake2b(identifier.encode(), digest_size=8).digest(), "little", signed=True)
+
+
+class FeedColumns:
+    """
+    One decoded feed as parallel NumPy columns (one row per stop_time_update).
+    """
+
+    __slots__ = ("taken_at", "trip", "stop", "arrival", "trip_names")
+
+    def __init__(self, taken_at, trip, stop, arrival, trip_names):
+        self.taken_at = taken_at
+        self.trip = trip
+        self.stop = stop
+        self.arrival = arrival
+        # code -> trip_id for the (few dozen) trips in this snapshot
+        self.trip_names = trip_names
+
+    def __len__(self):
+        return len(self.arrival)
+
+
+def columns_from_index(index, taken_at=None):
+    """
+    Flatten a StopIndex into FeedColumns.
+    """
+    np = _numpy()
+    rows = sum(len(stop_rows) for stop_rows in index.by_stop.values())
+    trip = np.empty(rows, dtype=np.int64)
+    stop = np.empty(rows, dtype=np.int64)
+    arrival = np.empty(rows, dtype=np.int64)
+    trip_names = {}
+    position = 0
+    for stop_id, stop_rows in index.by_stop.items():
+        n = len(stop_rows)
+        stop[position:position + n] = code(stop_id)
+        for i, (timestamp, trip_id, _) in enumerate(stop_rows, position):
+            trip_code = trip_names.get(trip_id)
+            if trip_code is None:
+                trip_code = trip_names[trip_id] = code(trip_id)
+            trip[i] = trip_code
+            arrival[i] = timestamp
+        position += n
+    taken_at = taken_at or index.timestamp or int(clock.now())
+    return FeedColumns(taken_at, trip, stop, arrival, {v: k for k, v in trip_names.items()})
+
+
+class FeedHistory:
+    """
+    Fixed-size ring buffer of FeedColumns for one feed, with vectorized
+    stats computed across the buffered snapshots.
+    """
+
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self._slots = [None] * capacity
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def append(self, columns):
+        with self._lock:
+            self._slots[self._next] = columns
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def snapshots(self):
+        """
+        Buffered snapshots, oldest first.
+        """
+        with self._lock:
+            if self._count < self.capacity:
+                return self._slots[:self._count]
+            return self._slots[self._next:] + self._slots[:self._next]
+
+    def latest(self):
+        with self._lock:
+            return self._slots[(self._next - 1) % self.capacity] if self._count else None
+
+    def __len__(self):
+        return self._count
+
+    def _stacked(self, stop_id):
+        # (trip, arrival, taken_at) rows for one stop across every snapshot, oldest first
+        np = _numpy()
+        stop_code = code(stop_id)
+        trips, arrivals, taken = [], [], []
+        for columns in self.snapshots():
+            mask = columns.stop == stop_code
+            trips.append(columns.trip[mask])
+            arrivals.append(columns.arrival[mask])
+            taken.append(np.full(int(mask.sum()), columns.taken_at, dtype=np.int64))
+        if not trips:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty
+        return np.concatenate(trips), np.concatenate(arrivals), np.concatenate(taken)
+
+    def minutes_to_arrival(self, stop_id, now=None):
+        """
+        Sorted whole minutes until each upcoming arrival at `stop_id`,
+        from the latest snapshot.
+        """
+        np = _numpy()
+        columns = self.latest()
+        if columns is None:
+            return np.empty(0, dtype=np.int64)
+        now = int(clock.now() if now is None else now)
+        eta = columns.arrival[columns.stop == code(stop_id)] - now
+        return np.sort(eta[eta >= 0] // 60)
+
+    def headways(self, stop_id):
+        """
+        Seconds between consecutive trains that actually served `stop_id`.
+
+        A trip counts as served once it has dropped out of the feed (or its
+        last prediction is in the past); its last predicted time is taken as
+        the actual arrival.
+        """
+        np = _numpy()
+        trip, arrival, taken = self._stacked(stop_id)
+        latest = self.latest()
+        if latest is None or not len(trip):
+            return np.empty(0, dtype=np.int64)
+        # Last prediction per trip: unique over the reversed rows
+        _, last = np.unique(trip[::-1], return_index=True)
+        last = len(trip) - 1 - last
+        served = (taken[last] < latest.taken_at) | (arrival[last] <= latest.taken_at)
+        return np.diff(np.sort(arrival[last][served]))
+
+    def eta_drift(self, stop_id):
+        """
+        Per-trip ETA drift at `stop_id`: last prediction minus first
+        prediction, in seconds (positive = the train is running later).
+
+        Returns:
+            dict: trip_id -> drift seconds, for trips in the latest snapshot.
+        """
+        np = _numpy()
+        trip, arrival, _ = self._stacked(stop_id)
+        latest = self.latest()
+        if latest is None or not len(trip):
+            return {}
+        codes, first = np.unique(trip, return_index=True)
+        _, last = np.unique(trip[::-1], return_index=True)
+        last = len(trip) - 1 - last
+        drift = arrival[last] - arrival[first]
+        return {
+            latest.trip_names[c]: int(d)
+            for c, d in zip(codes.tolist(), drift.tolist())
+            if c in latest.trip_names
+        }
+
+    def stats(self, stop_id):
+        """
+        Summary for one stop: median headway and worst current drift, in seconds.
+        """
+        np = _numpy()
+        headways = self.headways(stop_id)
+        drift = self.eta_drift(stop_id)
+        return {
+            "median_headway": int(np.median(headways)) if len(headways) else None,
+            "max_drift": max(drift.values()) if drift else None,
+            "snapshots": len(self),
+        }
+
+
+_histories = {}
+_histories_lock = threading.Lock()
+_disabled = False
+
+
+def for_feed(url):
+    with _histories_lock:
+        history = _histories.get(url)
+        if history is None:
+            history = _histories[url] = FeedHistory()
+        return history
+
+
+def stop_stats(urls, stop_id):
+    """
+    stats() for `stop_id` from the first of `urls` whose history has data for it.
+    """
+    result = None
+    for url in urls:
+        result = for_feed(url).stats(stop_id)
+        if result["median_headway"] is not None or result["max_drift"] is not None:
+            return result
+    return result
+
+
+def record(url, index):
+    """
+    Add a newly decoded feed (as its StopIndex) to that feed's history.
+    """
+    global _disabled
+    if _disabled:
+        return
+    try:
+        columns = columns_from_index(index)
+    except ImportError:
+        _disabled = True
+        logging.warning("numpy not installed; feed history and headway stats disabled")
+        return
+    for_feed(url).append(columns)
@@ -0,0 +1,189 @@
+import logging
+import threading
+import time
+from urllib.parse import unquote, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError
+from urllib3.util.retry import Retry
+
+from utils import archive
+from utils.metrics import metrics
+
+# Per-source HTTP settings.
+#   timeout:     (connect, read) seconds
+#   retries:     max retries for a single request
+#   budget:      retries allowed in a burst across all requests to the source
+#   budget_rate: retry tokens regained per second
+SOURCES = {
+    "mta": {
+        "hosts": ("api-endpoint.mta.info",),
+        "timeout": (3.05, 5),
+        "retries": 1,
+        "budget": 5,
+        "budget_rate": 0.05,
+    },
+    "nws": {
+        "hosts": ("api.weather.gov",),
+        "timeout": (3.05, 5),
+        "retries": 2,
+        "budget": 5,
+        "budget_rate": 0.05,
+    },
+    "default": {
+        "hosts": (),
+        "timeout": (3.05, 10),
+        "retries": 0,
+        "budget": 0,
+        "budget_rate": 0,
+    },
+}
+
+# Enough keep-alive connections for every MTA feed to be fetched at once
+POOL_MAXSIZE = 10
+
+HEADERS = {
+    # api.weather.gov rejects requests without an identifying User-Agent
+    "User-Agent": "PiDash (Ebichu Dashboard)",
+    "Accept-Encoding": "gzip, deflate",
+}
+
+
+class RetryBudget:
+    """
+    Token bucket shared by every request to one source, so a dead upstream
+    cannot turn each poll into a burst of retries.
+    """
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self._tokens = capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def spend(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class BudgetedRetry(Retry):
+    """
+    urllib3 Retry that also draws from the source's RetryBudget.
+    """
+
+    budget = None
+
+    def new(self, **kw):
+        retry = super().new(**kw)
+        retry.budget = self.budget
+        return retry
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if self.budget is not None and not self.budget.spend():
+            raise MaxRetryError(_pool, url, error or Exception("retry budget exhausted"))
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+
+def _make_retry(config):
+    retry = BudgetedRetry(
+        total=config["retries"],
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    if config["budget"]:
+        retry.budget = RetryBudget(config["budget"], config["budget_rate"])
+    return retry
+
+
+def _build_session():
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    for name, config in SOURCES.items():
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, max_retries=_make_retry(config))
+        if name == "default":
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        for host in config["hosts"]:
+            session.mount(f"https://{host}/", adapter)
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def session():
+    """
+    The process-wide requests.Session (keep-alive pool per host).
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _build_session()
+        return _session
+
+
+def source_for(url):
+    host = urlsplit(url).hostname
+    for name, config in SOURCES.items():
+        if host in config["hosts"]:
+            return name
+    return "default"
+
+
+def endpoint_name(url):
+    """
+    Short label for a URL in metrics, e.g. "gtfs-l", "subway-alerts", "hourly".
+    """
+    path = unquote(urlsplit(url).path).rstrip("/")
+    if "/points/" in path:
+        return "points"
+    return path.rsplit("/", 1)[-1]
+
+
+def get(url, source=None, timeout=None, **kwargs):
+    """
+    GET through the shared pooled session.
+
+    Args:
+        url (str): URL to fetch.
+        source (str): Key in SOURCES; inferred from the host when omitted.
+        timeout: Overrides the source's (connect, read) timeout.
+
+    Returns:
+        requests.Response (or an archived stand-in in replay mode)
+    """
+    replay = archive.active_replay()
+    if replay is not None:
+        return replay.get(url)
+
+    source = source or source_for(url)
+    endpoint = endpoint_name(url)
+    start = time.perf_counter()
+    try:
+        response = session().get(url, timeout=timeout or SOURCES[source]["timeout"], **kwargs)
+    except Exception:
+        metrics.inc("fetch_errors", source=source, endpoint=endpoint)
+        raise
+    metrics.observe("fetch_seconds", time.perf_counter() - start, source=source, endpoint=endpoint)
+    metrics.inc("responses", source=source, endpoint=endpoint, status=response.status_code)
+    metrics.inc("response_bytes", len(response.content), source=source, endpoint=endpoint)
+
+    writer = archive.active_writer()
+    if writer is not None and response.status_code == 200:
+        try:
+            writer.append(source, url, response.content)
+        except OSError as e:
+            logging.error(f"Could not archive {url}: {e}")
+    return response
@@ -0,0 +1,244 @@
+"""
+Opt-in memory instrumentation for long-running kiosks.
+
+    PIDASH_MEMWATCH_INTERVAL=300      sample every 5 min (0, the default, disables it)
+    PIDASH_TRACEMALLOC=1              also diff tracemalloc snapshots by module
+    PIDASH_RSS_BUDGET_MB=200          warn and purge caches above this RSS
+
+Each sample logs RSS, live protobuf message counts and (with tracemalloc)
+the modules whose allocations grew most since the previous sample, and
+exports them as metrics. Modules register cheap-to-rebuild caches with
+`register_purge`; they are dropped when RSS goes over budget. With only a
+budget set, nothing is sampled or logged: RSS is read every
+BUDGET_CHECK_INTERVAL seconds and the purge hooks run when it is over.
+"""
+import gc
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+from utils.metrics import metrics
+
+MEMWATCH_INTERVAL = float(os.environ.get("PIDASH_MEMWATCH_INTERVAL", 0))
+TRACEMALLOC = os.environ.get("PIDASH_TRACEMALLOC", "") == "1"
+RSS_BUDGET_MB = float(os.environ.get("PIDASH_RSS_BUDGET_MB", 0))
+# With only a budget set, RSS is still checked this often (seconds)
+BUDGET_CHECK_INTERVAL = 60
+# Modules listed per tracemalloc diff
+TOP_MODULES = 10
+
+PIDASH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> callable that drops a cache; see register_purge
+PURGE_HOOKS = {}
+
+
+def rss_bytes():
+    # Current (not peak) resident set size, from /proc where available
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def module_of(filename):
+    """
+    Group an allocation's file: our own files by path ("utils/feeds.py"),
+    third-party code by top-level package ("google", "streamlit").
+    """
+    if filename.startswith(PIDASH_DIR + os.sep):
+        return os.path.relpath(filename, PIDASH_DIR)
+    parts = filename.replace("\\", "/").split("/")
+    for marker in ("site-packages", "dist-packages"):
+        if marker in parts:
+            i = parts.index(marker)
+            if i + 1 < len(parts):
+                return parts[i + 1].removesuffix(".py")
+    name = os.path.basename(filename).removesuffix(".py")
+    if name == "__init__":
+        name = os.path.basename(os.path.dirname(filename))
+    return "stdlib:" + name
+
+
+def by_module(snapshot):
+    """
+    module -> bytes currently allocated, from a tracemalloc snapshot.
+    """
+    sizes = {}
+    for stat in snapshot.statistics("filename"):
+        module = module_of(stat.traceback[0].filename)
+        sizes[module] = sizes.get(module, 0) + stat.size
+    return sizes
+
+
+def diff_by_module(old, new, top=TOP_MODULES):
+    """
+    [(module, growth bytes, total bytes), ...] largest growth first.
+    """
+    rows = [(module, size - old.get(module, 0), size) for module, size in new.items()]
+    rows += [(module, -size, 0) for module, size in old.items() if module not in new]
+    rows.sort(key=lambda row: row[1], reverse=True)
+    return rows[:top]
+
+
+def protobuf_counts():
+    """
+    Live protobuf message objects by type, e.g. {"TripUpdate": 1200}.
+
+    Walks every GC-tracked object, so it costs tens of ms; only called by
+    the sampler. Empty if protobuf was never imported.
+    """
+    message = sys.modules.get("google.protobuf.message")
+    if message is None:
+        return {}
+    counts = {}
+    for obj in gc.get_objects():
+        if isinstance(obj, message.Message):
+            name = type(obj).__name__
+            counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+def register_purge(name, purge):
+    """
+    Register `purge()` to be called when RSS goes over budget. It should only
+    drop data that is rebuilt on demand (decoded feeds, rendered HTML...).
+    Registering the same name again replaces the hook.
+    """
+    PURGE_HOOKS[name] = purge
+
+
+def _malloc_trim():
+    # Freed Python objects often stay in glibc's heap; hand it back to the OS
+    try:
+        import ctypes
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def purge():
+    """
+    Run every purge hook, collect garbage and return RSS bytes released.
+    """
+    before = rss_bytes()
+    for name, hook in list(PURGE_HOOKS.items()):
+        try:
+            hook()
+        except Exception as e:
+            logging.error(f"Memory purge hook {name} failed: {e}")
+    gc.collect()
+    _malloc_trim()
+    freed = before - rss_bytes()
+    metrics.inc("memory_purges")
+    logging.info(f"Purged {len(PURGE_HOOKS)} caches, RSS {before / 2**20:.1f} MB -> {(before - freed) / 2**20:.1f} MB")
+    return freed
+
+
+class MemoryWatch:
+    """
+    Periodic memory sampler; `sample()` can also be called directly (bench/soak.py).
+    """
+
+    def __init__(self, interval=MEMWATCH_INTERVAL, budget_mb=RSS_BUDGET_MB, trace=TRACEMALLOC, top=TOP_MODULES):
+        self.interval = interval
+        self.budget = budget_mb * 2**20
+        self.trace = trace
+        self.top = top
+        self.last = {}
+        # module -> bytes at the last tracemalloc sample
+        self.modules = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def sample(self):
+        """
+        Returns:
+            dict: {"rss", "protobuf", "traced", "growth": [(module, delta, total), ...]}
+        """
+        report = {"rss": rss_bytes(), "protobuf": protobuf_counts(), "traced": None, "growth": []}
+        if self.trace:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            modules = by_module(tracemalloc.take_snapshot())
+            report["traced"] = sum(modules.values())
+            if self.modules is not None:
+                report["growth"] = diff_by_module(self.modules, modules, self.top)
+            self.modules = modules
+        self.last = report
+        self.check_budget(report["rss"])
+        return report
+
+    def check_budget(self, rss):
+        """
+        Over budget: warn, purge caches, and warn again if that didn't help.
+        """
+        if not self.budget or rss <= self.budget:
+            return False
+        metrics.inc("rss_budget_exceeded")
+        logging.warning(f"RSS {rss / 2**20:.1f} MB is over the {self.budget / 2**20:.0f} MB budget, purging caches")
+        purge()
+        rss = rss_bytes()
+        if rss > self.budget:
+            logging.warning(f"RSS still {rss / 2**20:.1f} MB after purge; something is holding memory")
+        return True
+
+    def log(self, report):
+        total = sum(report["protobuf"].values())
+        logging.info(f"Memory: RSS {report['rss'] / 2**20:.1f} MB, {total} protobuf messages")
+        for module, delta, size in report["growth"]:
+            if delta:
+                logging.info(f"  {module}: {delta / 1024:+.1f} KB (now {size / 1024:.1f} KB)")
+
+    def gauges(self):
+        report = self.last
+        if not report:
+            return []
+        gauges = [("rss_bytes", report["rss"], {})]
+        gauges += [("protobuf_messages", count, {"type": name}) for name, count in report["protobuf"].items()]
+        if report["traced"] is not None:
+            gauges.append(("traced_bytes", report["traced"], {}))
+        return gauges
+
+    def _interval(self):
+        return self.interval or (BUDGET_CHECK_INTERVAL if self.budget else 0)
+
+    def _run(self):
+        while True:
+            try:
+                if self.interval:
+                    self.log(self.sample())
+                else:
+                    # Budget only: skip the object walk and the log line
+                    self.check_budget(rss_bytes())
+            except Exception as e:
+                logging.error(f"Memory sample failed: {e}")
+            time.sleep(self._interval())
+
+    def start(self):
+        """
+        Start sampling every `interval` seconds (idempotent; no-op if neither
+        an interval nor a budget is set).
+        """
+        with self._lock:
+            if not self._interval() or self._thread is not None:
+                return
+            metrics.register_gauges(self.gauges)
+            self._thread = threading.Thread(target=self._run, name="memwatch", daemon=True)
+            self._thread.start()
+
+
+watch = MemoryWatch()
+
+
+def start_memwatch():
+    watch.start()
@@ -0,0 +1,254 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Samples kept per timing series for p50/p90/p99
+RESERVOIR = 256
+QUANTILES = (0.5, 0.9, 0.99)
+
+METRICS_PORT = int(os.environ.get("PIDASH_METRICS_PORT", 0))
+METRICS_FILE = os.environ.get("PIDASH_METRICS_FILE")
+METRICS_FILE_INTERVAL = 30
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    # Prometheus text format: backslash, double quote and newline in label values
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Summary:
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=RESERVOIR)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    def quantile(self, q):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Metrics:
+    """
+    In-process counters, gauges and timing summaries keyed by name + labels.
+
+    Exported as Prometheus text (`to_prometheus`) or JSON (`to_json`).
+    Gauges that are cheaper to compute on demand (e.g. data age) are
+    registered as callbacks and evaluated at export time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.summaries = {}
+        self._callbacks = []
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            summary = self.summaries.get(key)
+            if summary is None:
+                summary = self.summaries[key] = Summary()
+            summary.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def register_gauges(self, callback):
+        """
+        `callback()` returns [(name, value, labels dict), ...] at export time.
+        """
+        self._callbacks.append(callback)
+
+    def _collect_gauges(self):
+        with self._lock:
+            gauges = dict(self.gauges)
+        for callback in self._callbacks:
+            try:
+                for name, value, labels in callback():
+                    gauges[_key(name, labels)] = value
+            except Exception as e:
+                logging.error(f"Metrics gauge callback failed: {e}")
+        return gauges
+
+    def to_prometheus(self, prefix="pidash_"):
+        lines = []
+        with self._lock:
+            counters = dict(self.counters)
+            summaries = {key: (s.count, s.sum, [s.quantile(q) for q in QUANTILES])
+                         for key, s in self.summaries.items()}
+        gauges = self._collect_gauges()
+
+        def typed(kind, items):
+            seen = set()
+            for (name, labels), value in sorted(items.items()):
+                full = prefix + name + ("_total" if kind == "counter" else "")
+                if full not in seen:
+                    seen.add(full)
+                    lines.append(f"# TYPE {full} {kind}")
+                if kind == "summary":
+                    count, total, quantiles = value
+                    for q, v in zip(QUANTILES, quantiles):
+                        lines.append(f"{full}{_format_labels(labels, [('quantile', q)])} {v:.6g}")
+                    lines.append(f"{full}_count{_format_labels(labels)} {count}")
+                    lines.append(f"{full}_sum{_format_labels(labels)} {total:.6g}")
+                else:
+                    lines.append(f"{full}{_format_labels(labels)} {value:.6g}")
+
+        typed("counter", counters)
+        typed("gauge", gauges)
+        typed("summary", summaries)
+        return "\n".join(lines) + "\n"
+
+    def to_json(self):
+        def flat(name, labels):
+            return name + _format_labels(labels)
+
+        with self._lock:
+            data = {
+                "counters": {flat(*key): v for key, v in self.counters.items()},
+                "summaries": {
+                    flat(*key): {
+                        "count": s.count,
+                        "sum": s.sum,
+                        "max": s.max,
+                        **{f"p{int(q * 100)}": s.quantile(q) for q in QUANTILES},
+                    }
+                    for key, s in self.summaries.items()
+                },
+            }
+        data["gauges"] = {flat(*key): v for key, v in self._collect_gauges().items()}
+        data["generated_at"] = time.time()
+        return data
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.summaries.clear()
+
+
+metrics = Metrics()
+
+
+# ---- Sampled, level-gated logging ----
+_log_counts = {}
+_log_lock = threading.Lock()
+
+
+def sampled_log(logger, level, message, key=None, every=100):
+    """
+    Log `message` only on the 1st, (every+1)th, ... call for `key`, and only
+    if `level` is enabled, so hot paths don't flood the Pi's SD card.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    key = key or message
+    with _log_lock:
+        count = _log_counts[key] = _log_counts.get(key, 0) + 1
+    if count % every == 1 or every <= 1:
+        logger.log(level, f"{message} (seen {count}x)" if count > 1 else message)
+
+
+# ---- Export ----
+_exporter_started = False
+_exporter_lock = threading.Lock()
+
+
+def _serve(port):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/metrics.json"):
+                body = json.dumps(metrics.to_json()).encode()
+                content_type = "application/json"
+            elif self.path.startswith("/metrics"):
+                body = metrics.to_prometheus().encode()
+                content_type = "text/plain; version=0.0.4"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    # Local only: the endpoint is for the Pi itself / an SSH tunnel
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logging.info(f"Metrics at http://127.0.0.1:{port}/metrics")
+
+
+def _write_file_loop(path):
+    while True:
+        try:
+            tmp = path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(metrics.to_json(), f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logging.error(f"Could not write metrics file {path}: {e}")
+        time.sleep(METRICS_FILE_INTERVAL)
+
+
+def start_exporters(port=METRICS_PORT, path=METRICS_FILE):
+    """
+    Start the Prometheus-style endpoint (PIDASH_METRICS_PORT) and/or the
+    periodic JSON dump (PIDASH_METRICS_FILE). Idempotent; no-op if neither is set.
+    """
+    global _exporter_started
+    with _exporter_lock:
+        if _exporter_started:
+            return
+        _exporter_started = True
+    if port:
+        try:
+            _serve(port)
+        except OSError as e:
+            logging.error(f"Could not start metrics endpoint on port {port}: {e}")
+    if path:
+        threading.Thread(target=_write_file_loop, args=(path,), name="metrics-file", daemon=True).start()
@@ -0,0 +1,87 @@
+"""
+Compact records passed from the fetchers to the snapshot and renderers.
+
+They hold raw values only (epoch seconds, feed text, NWS numbers); anything
+relative to "now" or meant for display is computed when it is rendered, so
+a snapshot stays correct however long it is served.
+"""
+import sys
+from dataclasses import dataclass, fields
+from datetime import datetime
+from types import MappingProxyType
+
+from utils import clock
+
+# dataclass(slots=True) below; fail with a clear message rather than a TypeError
+if sys.version_info < (3, 10):
+    raise RuntimeError("PiDash requires Python 3.10 or newer")
+
+# Added to every arrival countdown, as the board always has
+MINUTES_OFFSET = 3
+
+
+@dataclass(frozen=True, slots=True)
+class Arrival:
+    timestamp: int
+    trip_id: str
+    route_id: str
+    scheduled: bool = False
+
+    def minutes(self, now=None):
+        """
+        Minutes until arrival as shown on the board (None once it has left).
+        """
+        now = clock.now() if now is None else now
+        minutes = int((self.timestamp - now) // 60)
+        return minutes + MINUTES_OFFSET if minutes >= 0 else None
+
+    def arrival_time(self, tz=None):
+        return datetime.fromtimestamp(self.timestamp, tz)
+
+
+@dataclass(frozen=True, slots=True)
+class Alert:
+    id: str
+    header: str
+    description: str
+    # Start of the latest matching active period (0 if open-ended)
+    timestamp: int
+    summary: str = None
+
+    @property
+    def text(self):
+        return self.summary or self.header or self.description
+
+
+@dataclass(frozen=True, slots=True)
+class Weather:
+    name: str
+    temperature: int
+    unit: str
+    detailed_forecast: str
+    wind_speed: str
+    short_forecast: str
+    icon: str
+    highest_temperature: int
+    lowest_temperature: int
+
+
+def to_json(value):
+    """
+    Plain JSON-able copy of `value`, with records turned into dicts.
+    """
+    if isinstance(value, (Arrival, Alert, Weather)):
+        return {f.name: getattr(value, f.name) for f in fields(value)}
+    if isinstance(value, (dict, MappingProxyType)):
+        return {k: to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(v) for v in value]
+    return value
+
+
+def from_json(cls, data):
+    """
+    Rebuild a `cls` record from to_json() output, ignoring unknown keys.
+    """
+    names = {f.name for f in fields(cls)}
+    return cls(**{k: v for k, v in data.items() if k in names})
@@ -1,6 +1,17 @@
-from google.transit import gtfs_realtime_pb2
-import requests, datetime
-import openai
+import asyncio
+import datetime
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import replace
+
+from utils import clock
+from utils.metrics import metrics
+from utils.feeds import L_FEED_URL, get_stop_times
 
 def get_mta_status(stop_id="L15S"):
     """
@@ -8,20 +19,15 @@ def get_mta_status(stop_id="L15S"):
     L15S: southbound (to Canarsie)
     L15N: northbound (to 8 Av)
     """
-    url = "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-l"
-    feed = gtfs_realtime_pb2.FeedMessage()
-    response = requests.get(url, timeout=5)
-    feed.ParseFromString(response.content)
+    index = get_stop_times(L_FEED_URL, (stop_id,))
 
     arrivals = []
-    for entity in feed.entity:
-        if entity.HasField("trip_update"):
-            for update in entity.trip_update.stop_time_update:
-                if update.stop_id == stop_id and update.arrival.time:
-                    arrival = datetime.datetime.fromtimestamp(update.arrival.time)
-                    minutes = int((arrival - datetime.datetime.now()).total_seconds() // 60)
-                    if minutes >= 0:
-                        arrivals.append(minutes)
+    now = clock.datetime_now()
+    for timestamp, _, _ in index.arrivals(stop_id, after=int(now.timestamp())):
+        arrival = datetime.datetime.fromtimestamp(timestamp)
+        minutes = int((arrival - now).total_seconds() // 60)
+        if minutes >= 0:
+            arrivals.append(minutes)
     return sorted(arrivals)[:5]
 
 # Function to interact with OpenAI API
@@ -38,12 +44,186 @@ def query_openai(prompt, model="gpt-3.5-turbo", max_tokens=100):
         str: The response text from the OpenAI API.
     """
     try:
-        response = openai.ChatCompletion.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=max_tokens
-        )
-        return response['choices'][0]['message']['content'].strip()
+        return openai_backend(prompt, model, max_tokens)
     except Exception as e:
-        print(f"Error querying OpenAI API: {e}")
+        logging.error(f"Error querying OpenAI API: {e}")
         return None
+
+
+def openai_backend(prompt, model, max_tokens):
+    # Optional dependency, only needed for LLM features
+    import openai
+    response = openai.ChatCompletion.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=max_tokens
+    )
+    return response['choices'][0]['message']['content'].strip()
+
+
+def local_backend(prompt, model, max_tokens):
+    """
+    Offline stand-in for tests and development: deterministic, no network.
+    Batched prompts get one numbered line per item, like the real model.
+    """
+    items = BATCH_ITEM.findall(prompt)
+    if items:
+        return "\n".join(f"{n}. {' '.join(text.split()[:12])}" for n, text in items)
+    return " ".join(prompt.split()[:max_tokens])
+
+
+BACKENDS = {"openai": openai_backend, "local": local_backend}
+
+LLM_BACKEND = os.environ.get("PIDASH_LLM_BACKEND", "openai")
+LLM_MODEL = "gpt-3.5-turbo"
+LLM_CACHE_SIZE = 256
+LLM_CACHE_TTL = 6 * 3600
+# Alert summaries are opt-in (needs an API key, or PIDASH_LLM_BACKEND=local)
+LLM_SUMMARIES = os.environ.get("PIDASH_LLM_SUMMARIES") == "1"
+
+BATCH_PROMPT = (
+    "Summarize each numbered MTA service alert below in one short sentence for a "
+    "station display. Reply with exactly one line per alert, starting with its number.\n\n"
+)
+BATCH_ITEM = re.compile(r"^\[(\d+)\] (.*)$", re.MULTILINE)
+BATCH_ANSWER = re.compile(r"^\s*(\d+)[.):]\s*(.+)$", re.MULTILINE)
+
+
+class LLMClient:
+    """
+    Non-blocking, cached front end for an LLM backend.
+
+    - Responses are cached by (model, prompt) with a TTL and LRU eviction.
+    - Concurrent identical requests share one in-flight call.
+    - `batch` sends several uncached prompts as one numbered request.
+
+    Calls run on a small thread pool; `submit` returns a
+    concurrent.futures.Future and `query` awaits it from asyncio.
+    """
+
+    def __init__(self, backend=None, maxsize=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL, workers=2):
+        self.backend = backend or BACKENDS[LLM_BACKEND]
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._cache = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm")
+
+    def cached(self, model, prompt):
+        with self._lock:
+            return self._get((model, prompt))
+
+    def _get(self, key):
+        # Call with `_lock` held
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        text, expires = entry
+        if expires <= time.time():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return text
+
+    def _put(self, key, text):
+        # Call with `_lock` held
+        self._cache[key] = (text, time.time() + self.ttl)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def _call(self, key, model, prompt, max_tokens):
+        try:
+            with metrics.timer("llm_seconds", model=model):
+                text = self.backend(prompt, model, max_tokens)
+            with self._lock:
+                self._put(key, text)
+            return text
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def submit(self, prompt, model=LLM_MODEL, max_tokens=100):
+        key = (model, prompt)
+        with self._lock:
+            text = self._get(key)
+            if text is not None:
+                metrics.inc("llm_cache", result="hit")
+                future = Future()
+                future.set_result(text)
+                return future
+            future = self._in_flight.get(key)
+            if future is not None:
+                metrics.inc("llm_cache", result="coalesced")
+                return future
+            metrics.inc("llm_cache", result="miss")
+            future = self._in_flight[key] = self._executor.submit(self._call, key, model, prompt, max_tokens)
+            return future
+
+    async def query(self, prompt, model=LLM_MODEL, max_tokens=100):
+        return await asyncio.wrap_future(self.submit(prompt, model, max_tokens))
+
+    def batch(self, prompts, model=LLM_MODEL, max_tokens=40, timeout=None):
+        """
+        Answers for several short prompts, uncached ones sent as one request.
+
+        Returns:
+            list: one answer per prompt (None where the call failed).
+        """
+        answers = {prompt: self.cached(model, prompt) for prompt in prompts}
+        missing = [prompt for prompt, text in answers.items() if text is None]
+        if len(missing) == 1:
+            answers[missing[0]] = self.submit(missing[0], model, max_tokens).result(timeout)
+        elif missing:
+            # One line per item: alert text is often multi-line, and a stray
+            # line starting "[2] ..." would otherwise be read as another item
+            combined = BATCH_PROMPT + "\n".join(f"[{n}] {' '.join(prompt.split())}" for n, prompt in enumerate(missing, 1))
+            text = self.submit(combined, model, max_tokens * len(missing)).result(timeout)
+            parsed = {int(n): line.strip() for n, line in BATCH_ANSWER.findall(text or "")}
+            with self._lock:
+                for n, prompt in enumerate(missing, 1):
+                    if n in parsed:
+                        answers[prompt] = parsed[n]
+                        self._put((model, prompt), parsed[n])
+        return [answers[prompt] for prompt in prompts]
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def llm_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+        return _client
+
+
+async def query_openai_async(prompt, model=LLM_MODEL, max_tokens=100):
+    """
+    Cached, coalesced, non-blocking version of query_openai (None on error).
+    """
+    try:
+        return await llm_client().query(prompt, model, max_tokens)
+    except Exception as e:
+        logging.error(f"Error querying LLM: {e}")
+        return None
+
+
+def summarize_alerts(alerts, timeout=20):
+    """
+    One-line summaries for Alert records (see utils.get_l_train_alerts), in
+    one batched request for the alerts not seen before.
+
+    Returns:
+        list: the alerts, with `summary` set where one was produced.
+    """
+    prompts = [" ".join(filter(None, (alert.header, alert.description))) for alert in alerts]
+    try:
+        summaries = llm_client().batch(prompts, timeout=timeout)
+    except Exception as e:
+        logging.error(f"Alert summaries unavailable: {e}")
+        return alerts
+    return [replace(alert, summary=summary) if summary else alert for alert, summary in zip(alerts, summaries)]
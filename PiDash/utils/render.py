@@ -0,0 +1,442 @@
+import html
+from datetime import datetime
+
+from utils import clock
+from utils.get_l_train_arrivals import scheduled_arrivals
+from utils.weather import fahrenheit_to_celsius
+
+# ---- Custom CSS for sleek, compact design ----
+CSS = """
+<style>
+    /* Remove default padding and maximize space */
+    .block-container {
+        padding-top: 1rem;
+        padding-bottom: 0.5rem;
+        max-width: 100%;
+        display: flex;
+        flex-direction: column;
+        height: 100vh;
+    }
+    
+    /* Make columns flex containers */
+    [data-testid="column"] {
+        display: flex;
+        flex-direction: column;
+        height: 100%;
+    }
+    
+    /* Flex container for sections */
+    .flex-container {
+        display: flex;
+        flex-direction: column;
+        flex: 1;
+        min-height: 0;
+    }
+    
+    /* Hide Streamlit branding */
+    #MainMenu {visibility: hidden;}
+    footer {visibility: hidden;}
+    header {visibility: hidden;}
+    
+    /* Compact typography */
+    h1 {
+        font-size: 1.75rem !important;
+        font-weight: 600 !important;
+        margin: 0 0 0.25rem 0 !important;
+        padding: 0 !important;
+    }
+    
+    .stMarkdown p {
+        margin-bottom: 0.5rem;
+    }
+    
+    /* Time and date */
+    .time-display {
+        font-size: 3rem;
+        font-weight: 200;
+        line-height: 1;
+        margin-bottom: 0.25rem;
+    }
+    
+    .date-display {
+        font-size: 1rem;
+        opacity: 0.7;
+        margin-bottom: 1.5rem;
+    }
+    
+    .last-updated {
+        font-size: 0.6rem;
+        opacity: 0.5;
+        margin-bottom: 1rem;
+    }
+    
+    /* Section headers */
+    .section-header {
+        font-size: 1rem;
+        font-weight: 600;
+        margin-bottom: 0.75rem;
+        text-transform: uppercase;
+        letter-spacing: 0.5px;
+        opacity: 0.8;
+        border-bottom: 1px solid var(--secondary-background-color);
+        padding-bottom: 0.5rem;
+    }
+    
+    /* Weather main card */
+    .weather-main {
+        background-color: var(--secondary-background-color);
+        border-radius: 8px;
+        padding: 1.5rem;
+        text-align: center;
+        margin-bottom: 1rem;
+        flex-shrink: 0;
+    }
+    
+    .temp-large {
+        font-size: 3.5rem;
+        font-weight: 200;
+        line-height: 1;
+        margin: 0.5rem 0;
+    }
+    
+    .weather-condition {
+        font-size: 1.2rem;
+        opacity: 0.85;
+        margin-bottom: 0.5rem;
+    }
+    
+    .weather-location {
+        font-size: 0.85rem;
+        opacity: 0.6;
+    }
+    
+    /* Weather details grid */
+    .weather-grid {
+        display: grid;
+        grid-template-columns: repeat(2, 1fr);
+        gap: 0.75rem;
+        margin-bottom: 1rem;
+    }
+    
+    .weather-item {
+        background-color: var(--secondary-background-color);
+        border-radius: 6px;
+        padding: 0.75rem;
+        text-align: center;
+    }
+    
+    .weather-label {
+        font-size: 0.75rem;
+        opacity: 0.6;
+        margin-bottom: 0.25rem;
+        text-transform: uppercase;
+        letter-spacing: 0.5px;
+    }
+    
+    .weather-value {
+        font-size: 1.25rem;
+        font-weight: 600;
+    }
+    
+    /* Detailed forecast */
+    .forecast-detail {
+        background-color: var(--secondary-background-color);
+        border-radius: 6px;
+        padding: 1rem;
+        font-size: 0.9rem;
+        line-height: 1.5;
+        opacity: 0.85;
+        flex: 1;
+        overflow-y: auto;
+        min-height: 0;
+    }
+    
+    /* Train section */
+    .train-section {
+        display: flex;
+        flex-direction: column;
+        flex: 1;
+        min-height: 0;
+    }
+    
+    .train-arrivals {
+        flex: 1;
+        display: flex;
+        flex-direction: column;
+        min-height: 0;
+    }
+    
+    .train-direction {
+        font-size: 1.3rem;
+        font-weight: 600;
+        margin-bottom: 0.5rem;
+        opacity: 0.8;
+        flex-shrink: 0;
+    }
+    
+    /* Train arrival cards */
+    .train-card {
+        background-color: var(--secondary-background-color);
+        border-left: 3px solid #666666;
+        padding: 0.75rem 1rem;
+        margin-bottom: 0.5rem;
+        display: flex;
+        align-items: center;
+        justify-content: space-between;
+    }
+    
+    .train-time {
+        font-size: 2rem;
+        font-weight: 700;
+    }
+    
+    .train-label {
+        font-size: 0.8rem;
+        opacity: 0.7;
+    }
+    
+    /* Alert styling */
+    .alert-box {
+        background-color: #FFF3CD;
+        color: #856404;
+        border-left: 3px solid #FFC107;
+        padding: 0.75rem;
+        margin-bottom: 0.75rem;
+        font-size: 0.9rem;
+    }
+    
+    [data-theme="dark"] .alert-box {
+        background-color: #3d3416;
+        color: #ffd966;
+    }
+    
+    .no-alert {
+        background-color: var(--secondary-background-color);
+        border-left: 3px solid #28a745;
+        padding: 0.75rem;
+        margin-bottom: 0.75rem;
+        font-size: 0.9rem;
+        opacity: 0.8;
+    }
+    
+    /* Northbound / southbound side by side */
+    .train-columns {
+        display: grid;
+        grid-template-columns: repeat(2, 1fr);
+        gap: 1rem;
+    }
+    
+    .no-data {
+        text-align: center;
+        opacity: 0.5;
+        font-size: 0.85rem;
+        padding: 1rem;
+    }
+</style>
+"""
+
+# Direction labels for the Jefferson St board
+DIRECTIONS = (
+    ("L15N", "To 8 Av MANHATTAN"),
+    ("L15S", "To Canarsie ROCKAWAY"),
+)
+
+
+def _compact(markup):
+    # Markdown treats indented lines after a blank line as a code block, so
+    # drop blank lines and leading indentation before handing HTML to st.markdown
+    return "\n".join(line.strip() for line in markup.splitlines() if line.strip())
+
+
+def header_html(nyc_time):
+    return f'<div class="last-updated">Last updated: {nyc_time.strftime("%B %d @ %I:%M:%S %p")}</div>'
+
+
+def clock_html(nyc_time):
+    current_time = nyc_time.strftime("%I:%M %p")
+    current_date = nyc_time.strftime("%A, %B %d")
+    return (
+        f'<div class="time-display">{current_time}</div>'
+        f'<div class="date-display">{current_date}</div>'
+    )
+
+
+def stale_html(snapshot, source):
+    """Tag a panel with its data age when the upstream is failing."""
+    age = snapshot.age(source)
+    if snapshot.is_restored(source):
+        text = f"Refreshing · saved data from {int(age // 60)} min ago" if age is not None else "Refreshing"
+        return f'<div class="last-updated">{text}</div>'
+    if not snapshot.is_stale(source):
+        return ""
+    text = f"Upstream unavailable · showing data from {int(age // 60)} min ago" if age is not None else "Upstream unavailable"
+    return f'<div class="last-updated">{text}</div>'
+
+
+def weather_html(data, note=""):
+    """
+    The whole weather panel as one HTML string (None if there is no data).
+    """
+    if not data:
+        return None
+    celsius_temp = fahrenheit_to_celsius(data.temperature)
+    # Convert Fahrenheit to Celsius for highest and lowest temperatures
+    highest_temp_celsius = fahrenheit_to_celsius(data.highest_temperature)
+    lowest_temp_celsius = fahrenheit_to_celsius(data.lowest_temperature)
+    return _compact(f"""
+<div class="section-header">Outdoor Weather</div>
+{note}
+<div class="weather-main">
+    <div class="temp-large">{celsius_temp:.1f}°C</div>
+    <div class="weather-condition">{html.escape(data.short_forecast)}</div>
+    <div class="weather-location">{html.escape(data.name)}</div>
+</div>
+<div class="weather-grid">
+    <div class="weather-item">
+        <div class="weather-label">Highest Temp</div>
+        <div class="weather-value">{highest_temp_celsius:.1f}°C</div>
+    </div>
+    <div class="weather-item">
+        <div class="weather-label">Lowest Temp</div>
+        <div class="weather-value">{lowest_temp_celsius:.1f}°C</div>
+    </div>
+    <div class="weather-item">
+        <div class="weather-label">Wind Speed</div>
+        <div class="weather-value">{html.escape(data.wind_speed)}</div>
+    </div>
+    <div class="weather-item">
+        <div class="weather-label">Fahrenheit</div>
+        <div class="weather-value">{data.temperature}°F</div>
+    </div>
+</div>
+<div class="forecast-detail">{html.escape(data.detailed_forecast)}</div>
+""")
+
+
+def countdowns(arrivals, now=None, limit=3):
+    """
+    {stop_id: ((minutes, scheduled), ...)} for the arrivals on the board at
+    `now`: trains that have left are skipped, at most `limit` per direction.
+    Also the cache key for the trains panel, since it only changes when a
+    countdown ticks over or a train leaves.
+
+    A direction with no realtime train left (e.g. the feed has been down
+    long enough for the last good arrivals to depart) shows the timetable.
+    """
+    now = clock.now() if now is None else now
+    shown = {}
+    for stop_id, _ in DIRECTIONS:
+        rows = []
+        for arrival in arrivals.get(stop_id, ()):
+            minutes = arrival.minutes(now)
+            if minutes is not None:
+                rows.append((minutes, arrival.scheduled))
+                if len(rows) == limit:
+                    break
+        if not rows:
+            rows = [(arrival.minutes(now), True) for arrival in scheduled_arrivals(stop_id, now, limit)]
+        shown[stop_id] = tuple(rows)
+    return shown
+
+
+def _arrival_cards(rows):
+    if not rows:
+        return '<div class="no-data">No upcoming trains</div>'
+    return "".join(f"""
+<div class="train-card">
+    <div>
+        <div class="train-time">{minutes}</div>
+        <div class="train-label">{'min (sched)' if scheduled else 'minutes'}</div>
+    </div>
+</div>""" for minutes, scheduled in rows)
+
+
+def _headway_label(stats):
+    headway = stats.get("median_headway") if stats else None
+    if not headway:
+        return ""
+    return f'<div class="train-label">every ~{round(headway / 60)} min</div>'
+
+
+def alert_html(alert):
+    """
+    One service alert box; alerts arrive as raw text + epoch and are only
+    formatted here, for the ones actually on screen.
+    """
+    when = datetime.fromtimestamp(alert.timestamp).strftime('%Y-%m-%d %H:%M:%S') if alert.timestamp else 'N/A'
+    return f'<div class="alert-box">{html.escape(alert.text)}<br>@{when}</div>'
+
+
+def trains_html(alerts, arrivals, note="", limit=3, headways=None, now=None):
+    """
+    The whole L train panel (alerts + both directions) as one HTML string,
+    with countdowns as of `now`.
+    """
+    headways = headways or {}
+    shown = countdowns(arrivals, now, limit)
+    if alerts:
+        alert_boxes = "".join(alert_html(alert) for alert in alerts)
+    else:
+        alert_boxes = '<div class="no-alert">No current service alerts</div>'
+    columns = "".join(
+        f'<div><div class="train-direction">{label}</div>{_headway_label(headways.get(stop_id))}{_arrival_cards(shown[stop_id])}</div>'
+        for stop_id, label in DIRECTIONS
+    )
+    return _compact(f"""
+<div class="train-section">
+    <div class="section-header">L Train @ Jefferson St</div>
+    {note}
+    {alert_boxes}
+    <div class="train-arrivals"><div class="train-columns">{columns}</div></div>
+</div>
+""")
+
+
+# Standalone page (server.py): Streamlit's own layout isn't there, so the
+# two-column split is a plain CSS grid
+PAGE_CSS = """
+<style>
+    body {
+        margin: 0;
+        padding: 1rem;
+        font-family: "Source Sans Pro", sans-serif;
+    }
+    .page-columns {
+        display: grid;
+        grid-template-columns: 1fr 1fr;
+        gap: 1.5rem;
+    }
+</style>
+"""
+
+
+def page_html(snapshot, nyc_time, updated_time, refresh=15):
+    """
+    The whole dashboard as one static HTML document, reloading itself every
+    `refresh` seconds.
+    """
+    weather = weather_html(snapshot.weather, stale_html(snapshot, "weather"))
+    trains = trains_html(snapshot.alerts, snapshot.arrivals, stale_html(snapshot, "arrivals"), headways=snapshot.headways)
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta http-equiv="refresh" content="{refresh}">
+<title>Ebichu Dashboard</title>
+{CSS}
+{PAGE_CSS}
+</head>
+<body>
+{header_html(updated_time)}
+<div class="page-columns">
+<div>
+{clock_html(nyc_time)}
+{weather or '<div class="no-data">Failed to load weather data.</div>'}
+</div>
+<div>
+{trains}
+</div>
+</div>
+</body>
+</html>
+"""
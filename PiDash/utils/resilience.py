@@ -0,0 +1,58 @@
+import random
+import threading
+import time
+
+
+class CircuitBreaker:
+    """
+    Per-source circuit breaker with exponential backoff.
+
+    closed    -> calls go through; consecutive failures are counted
+    open      -> calls are skipped until `retry_at` (backoff doubles each time)
+    half_open -> a single probe call is allowed; success closes, failure reopens
+    """
+
+    def __init__(self, name, failure_threshold=3, base_delay=5, max_delay=300, jitter=0.2):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.state = "closed"
+        self.failures = 0
+        self.retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self, now=None):
+        """
+        Whether a call to the upstream may be made right now.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and now >= self.retry_at:
+                self.state = "half_open"
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self.retry_at = 0.0
+
+    def record_failure(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                exponent = max(0, self.failures - self.failure_threshold)
+                delay = min(self.max_delay, self.base_delay * 2 ** exponent)
+                delay *= 1 + random.uniform(-self.jitter, self.jitter)
+                self.retry_at = now + delay
+
+    def snapshot(self):
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "retry_at": self.retry_at}
@@ -0,0 +1,306 @@
+"""
+Static GTFS schedule, loaded once from the MTA's zip into a small SQLite
+index so it can fill in when realtime data is missing.
+
+    python utils/schedule.py google_transit.zip L    # build the index (L trains only)
+    PIDASH_GTFS_ZIP=/path/google_transit.zip         # or build in the background at startup
+
+The index keeps only what the dashboard asks for: stop names, and
+(stop_id, departure seconds, trip) rows for the board's routes clustered
+by stop, so "next departures at stop X" is a single index range scan.
+"""
+import csv
+import datetime
+import io
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zipfile
+from functools import lru_cache
+
+import pytz
+
+from utils import clock
+from utils.disk_cache import CACHE_DIR
+
+GTFS_ZIP = os.environ.get("PIDASH_GTFS_ZIP")
+DB_PATH = os.path.join(CACHE_DIR, "gtfs.sqlite")
+# Bump when the tables below change so old indexes are rebuilt
+SCHEMA_VERSION = "1"
+# A failed build is retried after this many seconds
+RETRY_DELAY = 600
+
+NYC = pytz.timezone("America/New_York")
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID;
+CREATE TABLE stops (stop_id TEXT PRIMARY KEY, name TEXT, parent TEXT) WITHOUT ROWID;
+CREATE TABLE trips (trip INTEGER PRIMARY KEY, trip_id TEXT, route_id TEXT, service_id TEXT);
+CREATE TABLE stop_times (
+    stop_id TEXT, departure INTEGER, trip INTEGER,
+    PRIMARY KEY (stop_id, departure, trip)
+) WITHOUT ROWID;
+-- days: 7 chars, Monday first, '1' = runs
+CREATE TABLE calendar (service_id TEXT PRIMARY KEY, days TEXT, start_date TEXT, end_date TEXT) WITHOUT ROWID;
+CREATE TABLE calendar_dates (
+    date TEXT, service_id TEXT, exception_type INTEGER,
+    PRIMARY KEY (date, service_id)
+) WITHOUT ROWID;
+"""
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+
+def _rows(archive, name):
+    try:
+        with archive.open(name) as raw:
+            yield from csv.DictReader(io.TextIOWrapper(raw, encoding="utf-8-sig"))
+    except KeyError:
+        # calendar_dates.txt (and even calendar.txt) are optional in GTFS
+        return
+
+
+def _seconds(hms):
+    # GTFS times can run past 24:00:00 for trips that started the day before
+    h, m, s = hms.strip().split(":")
+    return int(h) * 3600 + int(m) * 60 + int(s)
+
+
+def _fingerprint(zip_path, routes=None):
+    stat = os.stat(zip_path)
+    routes = ",".join(sorted(routes)) if routes else "*"
+    return f"{SCHEMA_VERSION}:{stat.st_size}:{int(stat.st_mtime)}:{routes}"
+
+
+def build(zip_path, db_path=DB_PATH, routes=None):
+    """
+    Build the SQLite index from a GTFS zip (atomically replacing db_path).
+
+    Args:
+        routes (iterable): Only keep trips on these route ids (None = all).
+    """
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    tmp = db_path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    routes = set(routes) if routes else None
+    db = sqlite3.connect(tmp)
+    try:
+        db.executescript(SCHEMA)
+        with zipfile.ZipFile(zip_path) as archive:
+            db.executemany(
+                "INSERT INTO stops VALUES (?, ?, ?)",
+                ((r["stop_id"], r["stop_name"], r.get("parent_station") or None) for r in _rows(archive, "stops.txt")),
+            )
+            trips = {}
+            for r in _rows(archive, "trips.txt"):
+                if routes is None or r["route_id"] in routes:
+                    trips[r["trip_id"]] = (len(trips) + 1, r["route_id"], r["service_id"])
+            db.executemany(
+                "INSERT INTO trips VALUES (?, ?, ?, ?)",
+                ((number, trip_id, route_id, service_id) for trip_id, (number, route_id, service_id) in trips.items()),
+            )
+            db.executemany(
+                "INSERT OR IGNORE INTO stop_times VALUES (?, ?, ?)",
+                (
+                    (r["stop_id"], _seconds(r["departure_time"] or r["arrival_time"]), trips[r["trip_id"]][0])
+                    for r in _rows(archive, "stop_times.txt")
+                    if r["trip_id"] in trips and (r["departure_time"] or r["arrival_time"])
+                ),
+            )
+            db.executemany(
+                "INSERT INTO calendar VALUES (?, ?, ?, ?)",
+                (
+                    (r["service_id"], "".join(r[day] for day in WEEKDAYS), r["start_date"], r["end_date"])
+                    for r in _rows(archive, "calendar.txt")
+                ),
+            )
+            db.executemany(
+                "INSERT OR REPLACE INTO calendar_dates VALUES (?, ?, ?)",
+                ((r["date"], r["service_id"], int(r["exception_type"])) for r in _rows(archive, "calendar_dates.txt")),
+            )
+        db.execute("INSERT INTO meta VALUES ('source', ?)", (_fingerprint(zip_path, routes),))
+        db.commit()
+        db.execute("VACUUM")
+    finally:
+        db.close()
+    os.replace(tmp, db_path)
+    logging.info(f"Built GTFS schedule index {db_path} from {zip_path}")
+
+
+class Schedule:
+    """
+    Read-only queries against a built index. Safe to share between threads.
+    """
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self._db = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.stop_name = lru_cache(maxsize=1024)(self._stop_name)
+        self.services = lru_cache(maxsize=8)(self._services)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def source(self):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+        return row[0] if row else None
+
+    def _stop_name(self, stop_id):
+        """
+        Human name for a stop id, e.g. "L15S" -> "Jefferson St" (the id itself if unknown).
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT name FROM stops WHERE stop_id = ?", (stop_id,)
+            ).fetchone()
+        return row[0] if row else stop_id
+
+    def _services(self, date):
+        """
+        service_ids running on `date` (a datetime.date), per calendar + calendar_dates.
+        """
+        ymd = date.strftime("%Y%m%d")
+        with self._lock:
+            rows = self._db.execute(
+                """
+                SELECT service_id FROM calendar
+                 WHERE start_date <= :ymd AND end_date >= :ymd AND substr(days, :weekday, 1) = '1'
+                UNION SELECT service_id FROM calendar_dates WHERE date = :ymd AND exception_type = 1
+                EXCEPT SELECT service_id FROM calendar_dates WHERE date = :ymd AND exception_type = 2
+                """,
+                {"ymd": ymd, "weekday": date.weekday() + 1},
+            ).fetchall()
+        return tuple(service_id for service_id, in rows)
+
+    def next_departures(self, stop_id, after=None, limit=3):
+        """
+        Scheduled departures at `stop_id` at or after `after` (epoch, default now).
+
+        Returns:
+            list: [(departure epoch, trip_id, route_id), ...] in time order,
+            the same rows StopIndex.arrivals returns.
+        """
+        after = int(clock.now() if after is None else after)
+        today = datetime.datetime.fromtimestamp(after, NYC).date()
+        results = []
+        # Yesterday's service can still be running past midnight (times > 24:00)
+        for service_date in (today - datetime.timedelta(days=1), today):
+            services = self.services(service_date)
+            if not services:
+                continue
+            midnight = int(NYC.localize(datetime.datetime.combine(service_date, datetime.time())).timestamp())
+            placeholders = ",".join("?" * len(services))
+            with self._lock:
+                rows = self._db.execute(
+                    f"""
+                    SELECT st.departure, t.trip_id, t.route_id
+                      FROM stop_times st JOIN trips t ON t.trip = st.trip
+                     WHERE st.stop_id = ? AND st.departure >= ? AND t.service_id IN ({placeholders})
+                     ORDER BY st.departure LIMIT ?
+                    """,
+                    (stop_id, after - midnight, *services, limit),
+                ).fetchall()
+            results.extend((midnight + seconds, trip_id, route_id) for seconds, trip_id, route_id in rows)
+        results.sort()
+        return results[:limit]
+
+
+_schedule = None
+_schedule_lock = threading.Lock()
+_routes = None
+_building = False
+_retry_at = 0.0
+
+
+def _load():
+    # Runs on its own thread: indexing a full GTFS zip takes minutes on a Pi
+    global _schedule, _building, _retry_at
+    try:
+        if GTFS_ZIP and os.path.exists(GTFS_ZIP):
+            current = None
+            if os.path.exists(DB_PATH):
+                existing = Schedule(DB_PATH)
+                try:
+                    current = existing.source()
+                finally:
+                    existing.close()
+            if current != _fingerprint(GTFS_ZIP, _routes):
+                build(GTFS_ZIP, DB_PATH, _routes)
+        schedule = Schedule(DB_PATH)
+        schedule.source()
+        with _schedule_lock:
+            _schedule = schedule
+    except (OSError, sqlite3.Error, zipfile.BadZipFile, KeyError, ValueError) as e:
+        logging.error(f"GTFS schedule unavailable, retrying in {RETRY_DELAY} s: {e}")
+        with _schedule_lock:
+            _retry_at = time.time() + RETRY_DELAY
+    finally:
+        with _schedule_lock:
+            _building = False
+
+
+def _configured():
+    return bool(GTFS_ZIP and os.path.exists(GTFS_ZIP)) or os.path.exists(DB_PATH)
+
+
+def _ensure_loading():
+    global _building
+    with _schedule_lock:
+        if _schedule is not None or _building or time.time() < _retry_at or not _configured():
+            return
+        _building = True
+    threading.Thread(target=_load, name="gtfs-schedule", daemon=True).start()
+
+
+def prepare(routes=None):
+    """
+    Start loading the schedule in the background, (re)building the index
+    from PIDASH_GTFS_ZIP for `routes` if needed. Called at startup so the
+    first realtime gap finds it ready.
+    """
+    global _routes
+    with _schedule_lock:
+        _routes = tuple(routes) if routes else None
+    _ensure_loading()
+
+
+def get_schedule():
+    """
+    The shared Schedule, or None if no schedule is configured or it is still
+    being built. Never blocks on a build; a failed one is retried after
+    RETRY_DELAY.
+    """
+    with _schedule_lock:
+        if _schedule is not None:
+            return _schedule
+    _ensure_loading()
+    return None
+
+
+def stop_name(stop_id):
+    schedule = get_schedule()
+    return schedule.stop_name(stop_id) if schedule is not None else stop_id
+
+
+def next_departures(stop_id, after=None, limit=3):
+    schedule = get_schedule()
+    return schedule.next_departures(stop_id, after, limit) if schedule is not None else []
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    build(sys.argv[1] if len(sys.argv) > 1 else GTFS_ZIP, routes=sys.argv[2:] or None)
+    schedule = Schedule()
+    for stop_id in ("L15N", "L15S"):
+        start = time.perf_counter()
+        departures = schedule.next_departures(stop_id)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{schedule.stop_name(stop_id)} ({stop_id}): {len(departures)} departures in {elapsed:.2f} ms")
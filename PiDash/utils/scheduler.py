@@ -0,0 +1,91 @@
+import random
+import threading
+
+import pytz
+
+from utils import clock
+from utils.metrics import metrics
+
+NYC = pytz.timezone("America/New_York")
+
+# Hours (NYC) when the L runs every ~20 min and polling can slow down
+OVERNIGHT = (1, 5)
+# +/- fraction added to every interval so sources don't poll in lockstep
+JITTER = 0.1
+# Each unchanged refresh stretches the interval by this much, up to MAX_BACKOFF x
+BACKOFF_STEP = 0.5
+MAX_BACKOFF = 4
+
+
+def is_overnight(now=None):
+    hour = clock.datetime_now(NYC).hour if now is None else now.hour
+    return OVERNIGHT[0] <= hour < OVERNIGHT[1]
+
+
+class RefreshScheduler:
+    """
+    Decides when each source is next refreshed.
+
+    policies: source name -> {
+        "interval":  seconds, or callable(snapshot) -> seconds
+        "min", "max": bounds on the final interval
+        "overnight": multiplier applied during OVERNIGHT hours
+        "expiry":    True if "interval" is the time until the data expires
+    }
+
+    An interval at or below its policy's "min" (e.g. a train is about to
+    arrive) is used as is; otherwise it backs off while the source keeps
+    returning unchanged data and snaps back as soon as something changes.
+    Expiry intervals (e.g. weather's Cache-Control) already say when new
+    data can appear, so they get neither backoff, overnight nor jitter.
+    Sources without a policy use `default_interval`.
+    """
+
+    def __init__(self, policies, default_interval):
+        self.policies = policies
+        self.default_interval = default_interval
+        self._due = {}
+        self._unchanged = {}
+        self._lock = threading.Lock()
+
+    def interval(self, name, snapshot, changed):
+        policy = self.policies.get(name)
+        if policy is None:
+            return self.default_interval
+        interval = policy["interval"]
+        interval = interval(snapshot) if callable(interval) else interval
+        with self._lock:
+            unchanged = 0 if changed else self._unchanged.get(name, 0) + 1
+            self._unchanged[name] = unchanged
+        if policy.get("expiry"):
+            return min(policy["max"], max(policy["min"], interval))
+        if interval > policy["min"]:
+            interval *= min(MAX_BACKOFF, 1 + BACKOFF_STEP * unchanged)
+            if is_overnight():
+                interval *= policy.get("overnight", 1)
+        interval = min(policy["max"], max(policy["min"], interval))
+        return interval * (1 + random.uniform(-JITTER, JITTER))
+
+    def started(self, name):
+        # In flight: not due again until done() reschedules it
+        with self._lock:
+            self._due[name] = float("inf")
+
+    def done(self, name, snapshot, changed):
+        """
+        Schedule the next refresh of `name` after one finished.
+        """
+        interval = self.interval(name, snapshot, changed)
+        metrics.set("refresh_interval_seconds", interval, source=name)
+        with self._lock:
+            self._due[name] = clock.now() + interval
+        return interval
+
+    def due(self, names, now=None):
+        now = clock.now() if now is None else now
+        with self._lock:
+            return [name for name in names if self._due.get(name, 0) <= now]
+
+    def next_due(self):
+        with self._lock:
+            return min(self._due.values(), default=0)
@@ -0,0 +1,368 @@
+import threading
+import logging
+import time
+from dataclasses import dataclass, field, replace
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.weather import fetch_weather, weather_expires
+from utils.get_l_train_alerts import fetch_l_train_alerts
+from utils.get_l_train_arrivals import fetch_arrivals, restore_arrivals
+from utils import archive, clock, history, memwatch
+from utils.feeds import feed_urls_for_routes
+from utils.disk_cache import cache as disk_cache
+from utils.metrics import metrics, start_exporters
+from utils.models import Alert, Weather, from_json, to_json
+from utils.resilience import CircuitBreaker
+from utils.schedule import prepare as prepare_schedule
+from utils.scheduler import RefreshScheduler
+
+# Jefferson St (L15) and lower Manhattan for the weather panel
+LAT, LON = 40.7128, -74.0060
+STOP_IDS = ("L15N", "L15S")
+# Lines shown on the board; each maps to its MTA feed in utils.feeds.ROUTE_FEEDS
+ROUTES = ("L",)
+
+# Refresh interval (seconds) for sources without a SCHEDULE policy
+REFRESH_INTERVAL = 15
+# Poll fastest when a train is this close (minutes)
+APPROACH_MINUTES = 5
+
+# Source name -> fetch function. Each must raise on failure so the last
+# good value can be kept instead of being replaced by an empty result.
+SOURCES = {
+    "weather": lambda: fetch_weather(LAT, LON),
+    "alerts": lambda: fetch_l_train_alerts(),
+    "arrivals": lambda: fetch_arrivals(list(STOP_IDS), ROUTES),
+    # Computed from the in-memory feed history, no upstream call
+    "headways": lambda: {stop_id: history.stop_stats(feed_urls_for_routes(ROUTES), stop_id) for stop_id in STOP_IDS},
+}
+
+
+def _arrivals_interval(snapshot):
+    now = clock.now()
+    minutes = [arrival.minutes(now) for rows in snapshot.arrivals.values() for arrival in rows if not arrival.scheduled]
+    soonest = min((m for m in minutes if m is not None), default=None)
+    return 15 if soonest is not None and soonest <= APPROACH_MINUTES else 30
+
+
+def _weather_interval(snapshot):
+    # fetch_weather serves from memory until Expires, so poll just after it
+    return weather_expires(LAT, LON) - clock.now() + 1
+
+
+# Per-source refresh policy, see utils.scheduler.RefreshScheduler
+SCHEDULE = {
+    "arrivals": {"interval": _arrivals_interval, "min": 15, "max": 120, "overnight": 2},
+    "alerts": {"interval": 60, "min": 30, "max": 300, "overnight": 2},
+    "weather": {"interval": _weather_interval, "min": 60, "max": 1800, "expiry": True},
+    "headways": {"interval": 30, "min": 15, "max": 120, "overnight": 2},
+}
+
+
+# Last good value of each source is kept on disk so a restart paints at once.
+# Restored values older than this (seconds) are not shown.
+RESTORE_MAX_AGE = {
+    "weather": 6 * 3600,
+    "alerts": 3600,
+    "arrivals": 1800,
+    "headways": 3600,
+}
+# Turn a restored value (saved with models.to_json) back into records
+# before it is published
+RESTORE_HOOKS = {
+    "weather": lambda data: from_json(Weather, data),
+    "alerts": lambda rows: [from_json(Alert, row) for row in rows],
+    "arrivals": restore_arrivals,
+}
+# Each source is saved at most this often (seconds), changed or not, to spare
+# the SD card; a restart only needs reasonably recent data
+PERSIST_INTERVAL = 300
+# Scheduler loop granularity (seconds)
+MIN_SLEEP = 0.5
+
+
+def _freeze(value):
+    """
+    Recursively turn dicts/lists into read-only mappings/tuples so a
+    published snapshot can be shared between sessions safely.
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+@dataclass(frozen=True)
+class SourceStatus:
+    """
+    Freshness of one source in a snapshot.
+
+    updated_at is the time of the last *successful* fetch; error is set when
+    the latest attempt failed and the value shown is the previous good one.
+    version only changes when the value itself changes, so renderers can
+    skip panels whose data is identical to what they last drew. restored
+    marks a value loaded from the disk cache at startup, not yet refreshed.
+    """
+    updated_at: float = 0.0
+    error: str = None
+    breaker: str = "closed"
+    version: int = 0
+    restored: bool = False
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    Immutable view of everything the dashboard renders.
+    """
+    weather: object = None
+    alerts: tuple = ()
+    arrivals: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))
+    headways: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))
+    updated_at: float = 0.0
+    version: int = 0
+    status: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))
+
+    def age(self, source, now=None):
+        """
+        Seconds since `source` last refreshed successfully (None if never).
+        """
+        status = self.status.get(source)
+        if status is None or not status.updated_at:
+            return None
+        return (clock.now() if now is None else now) - status.updated_at
+
+    def is_stale(self, source):
+        status = self.status.get(source)
+        return status is not None and status.error is not None
+
+    def is_restored(self, source):
+        status = self.status.get(source)
+        return status is not None and status.restored
+
+    def source_version(self, source):
+        status = self.status.get(source)
+        return status.version if status is not None else 0
+
+
+class SnapshotStore:
+    """
+    Process-wide holder of the latest Snapshot.
+
+    One background thread refreshes each source on its own adaptive
+    schedule (SCHEDULE) and swaps in a new snapshot as each one lands;
+    every Streamlit session only reads `get()`, so upstream traffic does
+    not grow with the number of connected clients.
+
+    Reads never wait on upstream: a failing source keeps serving its last
+    good value (tagged with its age) while its circuit breaker backs off.
+    Last good values are also written to `cache` and restored on start.
+    """
+
+    def __init__(self, interval=REFRESH_INTERVAL, sources=None, cache=disk_cache, schedule=None):
+        self.interval = interval
+        self.sources = dict(sources or SOURCES)
+        self.scheduler = RefreshScheduler(SCHEDULE if schedule is None else schedule, interval)
+        self.cache = cache
+        self._persisted = {}
+        self.breakers = {name: CircuitBreaker(name) for name in self.sources}
+        self._snapshot = Snapshot()
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._in_flight = set()
+        self._thread = None
+        self._executor = ThreadPoolExecutor(max_workers=len(self.sources), thread_name_prefix="snapshot")
+
+    def get(self):
+        return self._snapshot
+
+    def _publish(self, name, value=None, error=None):
+        with self._lock:
+            snapshot = self._snapshot
+            previous = snapshot.status.get(name, SourceStatus())
+            now = clock.now()
+            changes = {}
+            version = previous.version
+            if not error:
+                value = _freeze(value)
+                if version == 0 or value != getattr(snapshot, name):
+                    changes[name] = value
+                    version += 1
+                changes["updated_at"] = now
+            status = SourceStatus(
+                updated_at=previous.updated_at if error else now,
+                error=error,
+                breaker=self.breakers[name].state,
+                version=version,
+            )
+            changes["status"] = MappingProxyType({**snapshot.status, name: status})
+            self._snapshot = replace(snapshot, version=snapshot.version + 1, **changes)
+            return self._snapshot
+
+    def refresh_source(self, name):
+        """
+        Fetch one source (if its breaker allows) and publish the result.
+        On failure the previous value is kept and only its status changes.
+        """
+        breaker = self.breakers[name]
+        if not breaker.allow():
+            return self._snapshot
+        try:
+            with metrics.timer("refresh_seconds", source=name):
+                value = self.sources[name]()
+        except Exception as e:
+            metrics.inc("refresh_errors", source=name)
+            breaker.record_failure()
+            logging.error(f"Refresh of {name} failed, serving last good data: {e}")
+            return self._publish(name, error=str(e) or type(e).__name__)
+        breaker.record_success()
+        snapshot = self._publish(name, value)
+        self._persist(name, value)
+        return snapshot
+
+    def _persist(self, name, value):
+        if self.cache is None:
+            return
+        now = time.time()
+        if now - self._persisted.get(name, 0) < PERSIST_INTERVAL:
+            return
+        self._persisted[name] = now
+        self.cache.set(f"snapshot:{name}", to_json(value))
+
+    def restore(self):
+        """
+        Publish the last good value of each source from the disk cache.
+
+        Returns:
+            bool: True if every source was restored (nothing to wait for).
+        """
+        if self.cache is None:
+            return False
+        restored = 0
+        for name in self.sources:
+            entry = self.cache.get(f"snapshot:{name}", max_age=RESTORE_MAX_AGE.get(name))
+            if entry is None:
+                continue
+            value, stored_at = entry
+            hook = RESTORE_HOOKS.get(name)
+            try:
+                value = _freeze(hook(value) if hook else value)
+            except Exception as e:
+                logging.error(f"Could not restore cached {name}: {e}")
+                continue
+            with self._lock:
+                snapshot = self._snapshot
+                status = SourceStatus(updated_at=stored_at, breaker=self.breakers[name].state, version=1, restored=True)
+                self._snapshot = replace(
+                    snapshot,
+                    version=snapshot.version + 1,
+                    updated_at=max(snapshot.updated_at, stored_at),
+                    status=MappingProxyType({**snapshot.status, name: status}),
+                    **{name: value},
+                )
+            restored += 1
+        if restored:
+            logging.info(f"Restored {restored}/{len(self.sources)} sources from disk cache")
+        return restored == len(self.sources)
+
+    def _refresh_in_background(self, name):
+        with self._lock:
+            if name in self._in_flight:
+                return None
+            self._in_flight.add(name)
+
+        self.scheduler.started(name)
+        version = self._snapshot.source_version(name)
+
+        def run():
+            snapshot = self._snapshot
+            try:
+                snapshot = self.refresh_source(name)
+            finally:
+                with self._lock:
+                    self._in_flight.discard(name)
+                self.scheduler.done(name, snapshot, snapshot.source_version(name) != version)
+
+        return self._executor.submit(run)
+
+    def refresh(self):
+        """
+        Refresh every source concurrently and wait for them to finish.
+        """
+        futures = [self._refresh_in_background(name) for name in self.sources]
+        for future in futures:
+            if future is not None:
+                future.result()
+        self._ready.set()
+        return self._snapshot
+
+    def _run(self):
+        self.refresh()
+        while True:
+            wait = self.scheduler.next_due() - clock.now()
+            clock.sleep(min(self.interval, max(MIN_SLEEP, wait)))
+            # Fire and forget: a slow source never delays the others
+            for name in self.scheduler.due(self.sources):
+                self._refresh_in_background(name)
+
+    def start(self):
+        """
+        Start the background refresher (idempotent).
+        """
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self._thread is None:
+                if archive.active_replay() is not None:
+                    # Replays start from the archive alone and must not overwrite live data
+                    self.cache = None
+                if self.cache is not None:
+                    # Drop rows left by older versions or past their TTL
+                    self.cache.purge()
+                if self.restore():
+                    self._ready.set()
+                # Timetable fallback for the board's routes, indexed off the refresh path
+                prepare_schedule(ROUTES)
+            self._thread = threading.Thread(target=self._run, name="snapshot-refresher", daemon=True)
+            self._thread.start()
+
+    def wait_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+
+store = SnapshotStore()
+
+
+def _snapshot_gauges():
+    snapshot = store.get()
+    now = clock.now()
+    gauges = [("snapshot_version", snapshot.version, {})]
+    for name in store.sources:
+        age = snapshot.age(name, now)
+        if age is not None:
+            gauges.append(("data_age_seconds", age, {"source": name}))
+        gauges.append(("breaker_open", int(store.breakers[name].state != "closed"), {"source": name}))
+    return gauges
+
+
+metrics.register_gauges(_snapshot_gauges)
+
+
+def get_snapshot(timeout=20):
+    """
+    Return the latest shared snapshot, starting the refresher on first use.
+
+    Until the first refresh has completed callers wait for it (bounded by
+    `timeout`) so the initial render is not empty; afterwards this returns
+    immediately.
+    """
+    # In replay mode this switches utils.clock to archive time before anything reads it
+    archive.active_replay()
+    start_exporters()
+    memwatch.start_memwatch()
+    store.start()
+    store.wait_ready(timeout)
+    return store.get()
@@ -0,0 +1,101 @@
+from bisect import bisect_left
+
+from utils import wire
+
+
+class StopIndex:
+    """
+    Lookup tables built from one decoded GTFS-realtime feed.
+
+    by_stop: stop_id -> [(arrival epoch, trip_id, route_id), ...] sorted by time
+    trips:   trip_id -> ((stop_id, arrival epoch), ...) in stop sequence order
+
+    Any number of stations/directions can be answered from a single decode
+    with dictionary lookups instead of rescanning every stop_time_update.
+    """
+
+    def __init__(self, by_stop, trips, timestamp=0):
+        self.by_stop = by_stop
+        self.trips = trips
+        self.timestamp = timestamp
+
+    def arrivals(self, stop_id, after=None):
+        """
+        Arrivals at one stop, optionally only those at or after `after` (epoch).
+        """
+        rows = self.by_stop.get(stop_id, [])
+        if after is None:
+            return rows
+        return rows[bisect_left(rows, (after,)):]
+
+    def lookup(self, stop_ids, after=None):
+        """
+        Arrivals for several stops at once: {stop_id: [(time, trip_id, route_id), ...]}.
+        """
+        return {stop_id: self.arrivals(stop_id, after) for stop_id in stop_ids}
+
+    def station(self, station_id, directions="NS", after=None):
+        """
+        Arrivals for a parent station, e.g. station("L15") -> L15N and L15S.
+        """
+        return self.lookup([station_id + d for d in directions], after)
+
+    def trip_stops(self, trip_id):
+        return self.trips.get(trip_id, ())
+
+
+def build_stop_index(feed):
+    """
+    Walk every trip_update once and build a StopIndex.
+    """
+    by_stop = {}
+    trips = {}
+    for entity in feed.entity:
+        if not entity.HasField("trip_update"):
+            continue
+        trip_id = entity.trip_update.trip.trip_id
+        route_id = entity.trip_update.trip.route_id
+        sequence = []
+        for update in entity.trip_update.stop_time_update:
+            timestamp = update.arrival.time
+            if not timestamp:
+                continue
+            sequence.append((update.stop_id, timestamp))
+            rows = by_stop.get(update.stop_id)
+            if rows is None:
+                rows = by_stop[update.stop_id] = []
+            rows.append((timestamp, trip_id, route_id))
+        if trip_id:
+            trips[trip_id] = tuple(sequence)
+
+    for rows in by_stop.values():
+        rows.sort()
+    return StopIndex(by_stop, trips, feed.header.timestamp)
+
+
+def build_stop_index_from_wire(content, stop_ids=None):
+    """
+    Same StopIndex as build_stop_index, read straight from the serialized
+    feed without building FeedMessage objects.
+
+    With `stop_ids`, only those stops are indexed (and `trips` only lists
+    them), which skips most of the feed for a single station.
+    """
+    by_stop = {}
+    trips = {}
+    for trip_id, route_id, stops in wire.trip_updates(content, stop_ids):
+        sequence = []
+        for stop_id, timestamp in stops:
+            if not timestamp:
+                continue
+            sequence.append((stop_id, timestamp))
+            rows = by_stop.get(stop_id)
+            if rows is None:
+                rows = by_stop[stop_id] = []
+            rows.append((timestamp, trip_id, route_id))
+        if trip_id:
+            trips[trip_id] = tuple(sequence)
+
+    for rows in by_stop.values():
+        rows.sort()
+    return StopIndex(by_stop, trips, wire.header_timestamp(content))
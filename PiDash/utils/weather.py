@@ -1,99 +1,166 @@
-import requests
-import time
+import logging
+import threading
+import email.utils
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import clock, http
+from utils.disk_cache import cache as disk_cache
+from utils.metrics import metrics
+from utils.models import Weather
+
+POINTS_URL = "https://api.weather.gov/points/{lat},{lon}"
+
+# The points -> gridpoint URL mapping barely ever changes; it is kept in the disk cache
+POINTS_TTL = 30 * 24 * 3600
+
+# Used when NWS sends neither Cache-Control nor Expires
+DEFAULT_TTL = 600
+
+_points_cache = {}
+_points_lock = threading.Lock()
+_forecast_cache = {}
+_forecast_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="nws")
+
+
+def resolve_forecast_urls(lat, lon):
+    """
+    Map (lat, lon) to the NWS forecast and hourly forecast URLs.
+
+    The points -> gridpoint mapping is effectively static, so it is resolved
+    once and persisted in the disk cache across restarts.
+    """
+    key = f"nws_points:{lat},{lon}"
+    with _points_lock:
+        urls = _points_cache.get(key)
+        if urls is None:
+            cached = disk_cache.get(key)
+            if cached is not None:
+                urls = _points_cache[key] = tuple(cached[0])
+    if urls is not None:
+        return urls
+
+    meta_resp = http.get(POINTS_URL.format(lat=lat, lon=lon), source="nws")
+    meta_resp.raise_for_status()
+    properties = meta_resp.json()["properties"]
+    forecast_url = properties["forecast"]
+    hourly_url = properties.get("forecastHourly") or forecast_url.replace("forecast", "forecast/hourly")
+
+    with _points_lock:
+        _points_cache[key] = (forecast_url, hourly_url)
+    disk_cache.set(key, [forecast_url, hourly_url], ttl=POINTS_TTL)
+    return forecast_url, hourly_url
+
+
+def cache_expiry(headers, now=None):
+    """
+    Work out when a response goes stale from its Cache-Control/Expires headers.
+
+    max-age counts from when the origin generated the response, so the time
+    it already spent in the NWS CDN cache (the Age header) is taken off.
+    """
+    now = clock.now() if now is None else now
+    age = headers.get("Age", "").strip()
+    age = int(age) if age.isdigit() else 0
+    cache_control = headers.get("Cache-Control", "")
+    for directive in cache_control.split(","):
+        name, _, value = directive.strip().partition("=")
+        if name.lower() == "max-age" and value.strip().isdigit():
+            return now + max(0, int(value) - age)
+    expires = headers.get("Expires")
+    if expires:
+        try:
+            return email.utils.parsedate_to_datetime(expires).timestamp()
+        except (TypeError, ValueError):
+            pass
+    return now + DEFAULT_TTL
+
+
+def _fetch_json(url):
+    resp = http.get(url, source="nws")
+    resp.raise_for_status()
+    return resp.json(), cache_expiry(resp.headers)
+
 
 def get_weather(lat, lon):
     """
     https://api.weather.gov/points/{lat},{lon}/forecast
+
+    Served from memory until the forecast's Cache-Control/Expires says it
+    is stale; the daily and hourly forecasts are fetched concurrently.
     """
     try:
-        # Step 1: 获取对应的 forecast URL
-        meta_url = f"https://api.weather.gov/points/{lat},{lon}"
-
-        meta_resp = requests.get(meta_url, timeout=5)
-
-        meta_resp.raise_for_status()
-        forecast_url = meta_resp.json()["properties"]["forecast"]
-        dayforecast_url = forecast_url.replace("forecast", "forecast/hourly")
-   
-        # Step 2: 获取天气预报
-        forecast_resp = requests.get(forecast_url, timeout=5)
-        dayforecast_resp = requests.get(dayforecast_url, timeout=5)
-        forecast_resp.raise_for_status()
-        dayforecast_resp.raise_for_status()
-        forecast_data = forecast_resp.json()
-        dayforecast_data = dayforecast_resp.json()
-        
-        print(dayforecast_data)
-
-        # 获取最近的预报信息
-        period = forecast_data["properties"]["periods"][0]
-
-        # 获取最高气温和最低气温
-        temperatures = [p["temperature"] for p in dayforecast_data["properties"]["periods"]]
-        highest_temp = max(temperatures)
-        lowest_temp = min(temperatures)
-
-        # 返回天气数据
-        return {
-            "name": period["name"],
-            "temperature": period["temperature"],
-            "unit": period["temperatureUnit"],
-            "detailedForecast": period["detailedForecast"],
-            "windSpeed": period["windSpeed"],
-            "shortForecast": period["shortForecast"],
-            "icon": period["icon"],
-            "highest_temperature": highest_temp,
-            "lowest_temperature": lowest_temp
-        }
+        return fetch_weather(lat, lon)
     except Exception as e:
-        print("Weather API error:", e)
+        logging.error(f"Weather API error: {e}")
         return None
 
-def fahrenheit_to_celsius(fahrenheit):
+
+def fetch_weather(lat, lon):
     """
-    Convert Fahrenheit to Celsius.
-    Formula: (F - 32) * 5/9
+    Same as get_weather, but raises on failure instead of returning None.
     """
-    return (fahrenheit - 32) * 5 / 9
+    key = (lat, lon)
+    with _forecast_lock:
+        cached = _forecast_cache.get(key)
+    if cached and cached["expires"] > clock.now():
+        metrics.inc("weather_cache", result="hit")
+        return cached["data"]
+    metrics.inc("weather_cache", result="miss")
+
+    # Step 1: forecast URLs for this location (cached)
+    forecast_url, dayforecast_url = resolve_forecast_urls(lat, lon)
 
-# 缓存天气数据和更新时间
-weather_cache = {
-    "data": None,
-    "last_updated": 0
-}
+    # Step 2: fetch both forecasts concurrently
+    forecast_future = _executor.submit(_fetch_json, forecast_url)
+    dayforecast_future = _executor.submit(_fetch_json, dayforecast_url)
+    forecast_data, forecast_expires = forecast_future.result()
+    dayforecast_data, dayforecast_expires = dayforecast_future.result()
 
-# 更新间隔（秒）
-UPDATE_INTERVAL = 600  # 10分钟
+    # Nearest forecast period
+    period = forecast_data["properties"]["periods"][0]
 
-def update_weather(lat, lon):
+    # Highest and lowest temperatures
+    temperatures = [p["temperature"] for p in dayforecast_data["properties"]["periods"]]
+    highest_temp = max(temperatures)
+    lowest_temp = min(temperatures)
+
+    # Weather record
+    data = Weather(
+        name=period["name"],
+        temperature=period["temperature"],
+        unit=period["temperatureUnit"],
+        detailed_forecast=period["detailedForecast"],
+        wind_speed=period["windSpeed"],
+        short_forecast=period["shortForecast"],
+        icon=period["icon"],
+        highest_temperature=highest_temp,
+        lowest_temperature=lowest_temp,
+    )
+    with _forecast_lock:
+        _forecast_cache[key] = {"data": data, "expires": min(forecast_expires, dayforecast_expires)}
+    return data
+
+
+def weather_expires(lat, lon):
     """
-    定时更新天气数据
+    When the cached forecast for (lat, lon) goes stale (0 if not cached).
     """
-    global weather_cache
-    while True:
-        weather_cache["data"] = get_weather(lat, lon)
-        weather_cache["last_updated"] = time.time()
-        print("Weather updated:", weather_cache["data"])
-        time.sleep(UPDATE_INTERVAL)
-
-def get_dynamic_weather():
+    with _forecast_lock:
+        cached = _forecast_cache.get((lat, lon))
+    return cached["expires"] if cached else 0
+
+def fahrenheit_to_celsius(fahrenheit):
     """
-    获取动态天气数据（从缓存中获取）
+    Convert Fahrenheit to Celsius.
+    Formula: (F - 32) * 5/9
     """
-    global weather_cache
-    return weather_cache["data"]
+    return (fahrenheit - 32) * 5 / 9
 
-# 示例：启动动态天气更新线程
+# Example: fetch the weather once
 if __name__ == "__main__":
-    latitude = 40.7128  # 示例经纬度（纽约）
+    latitude = 40.7128  # Example coordinates (New York)
     longitude = -74.0060
 
-    # 启动更新线程
-    weather_thread = threading.Thread(target=update_weather, args=(latitude, longitude), daemon=True)
-    weather_thread.start()
-
-    # 示例：每5秒获取一次动态天气数据
-    while True:
-        current_weather = get_dynamic_weather()
-        print("Current Weather:", current_weather)
-        time.sleep(5)
+    print("Current Weather:", get_weather(latitude, longitude))
+    print("Expires in", int(weather_expires(latitude, longitude) - clock.now()), "s")
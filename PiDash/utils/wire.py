@@ -0,0 +1,137 @@
+"""
+Minimal protobuf wire-format reader for the few GTFS-realtime fields the
+dashboard uses.
+
+Field numbers are from proto/gtfs-realtime.proto:
+
+    FeedMessage:    1 header, 2 entity
+    FeedHeader:     2 incrementality, 3 timestamp
+    FeedEntity:     3 trip_update
+    TripUpdate:     1 trip, 2 stop_time_update
+    TripDescriptor: 1 trip_id, 5 route_id
+    StopTimeUpdate: 2 arrival, 4 stop_id
+    StopTimeEvent:  2 time
+
+Everything else (vehicle positions, alerts, NYCT extensions, ...) is
+skipped by length without being decoded.
+"""
+
+VARINT, FIXED64, LEN, FIXED32 = 0, 1, 2, 5
+
+
+def read_varint(buf, pos):
+    result = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return result, pos
+        shift += 7
+
+
+def fields(buf, pos=0, end=None):
+    """
+    Yield (field number, wire type, value, pos) for each field in buf[pos:end].
+
+    value is the integer for varints and the end offset for length-delimited
+    fields, whose payload is buf[pos:value]. Fixed-width fields are skipped
+    (value None).
+    """
+    end = len(buf) if end is None else end
+    while pos < end:
+        key, pos = read_varint(buf, pos)
+        wire_type = key & 7
+        if wire_type == VARINT:
+            value, pos = read_varint(buf, pos)
+            yield key >> 3, wire_type, value, pos
+        elif wire_type == LEN:
+            length, pos = read_varint(buf, pos)
+            yield key >> 3, wire_type, pos + length, pos
+            pos += length
+        elif wire_type == FIXED64:
+            pos += 8
+        elif wire_type == FIXED32:
+            pos += 4
+        else:
+            raise ValueError(f"unsupported wire type {wire_type} at offset {pos}")
+
+
+def _header_varint(buf, number):
+    # Serializers emit fields in number order, so the header (field 1) is
+    # normally the first record and nothing after it is read
+    for field, wire_type, value, pos in fields(buf):
+        if field == 1 and wire_type == LEN:
+            for header_field, header_type, header_value, _ in fields(buf, pos, value):
+                if header_field == number and header_type == VARINT:
+                    return header_value
+            return 0
+    return 0
+
+
+def header_timestamp(buf):
+    return _header_varint(buf, 3)
+
+
+def header_incrementality(buf):
+    # FULL_DATASET (0) when absent, as in protobuf
+    return _header_varint(buf, 2)
+
+
+def _stop_time(buf, pos, end):
+    # (stop_id bytes, arrival.time) of one StopTimeUpdate
+    stop_id = b""
+    arrival = 0
+    for field, wire_type, value, start in fields(buf, pos, end):
+        if wire_type != LEN:
+            continue
+        if field == 4:
+            stop_id = buf[start:value]
+        elif field == 2:
+            for event_field, event_type, event_value, _ in fields(buf, start, value):
+                if event_field == 2 and event_type == VARINT:
+                    arrival = event_value
+    return stop_id, arrival
+
+
+def _trip(buf, pos, end):
+    trip_id = route_id = ""
+    for field, wire_type, value, start in fields(buf, pos, end):
+        if wire_type == LEN and field == 1:
+            trip_id = buf[start:value].decode()
+        elif wire_type == LEN and field == 5:
+            route_id = buf[start:value].decode()
+    return trip_id, route_id
+
+
+def trip_updates(buf, stop_ids=None):
+    """
+    Yield (trip_id, route_id, [(stop_id, arrival time), ...]) per TripUpdate.
+
+    With `stop_ids`, only those stops are returned and entities that don't
+    mention any of them are skipped with a substring search before any of
+    their fields are read.
+    """
+    wanted = None
+    if stop_ids is not None:
+        wanted = {stop_id.encode() for stop_id in stop_ids}
+    for field, wire_type, entity_end, entity_start in fields(buf):
+        if field != 2 or wire_type != LEN:
+            continue
+        if wanted is not None and not any(buf.find(stop_id, entity_start, entity_end) != -1 for stop_id in wanted):
+            continue
+        for entity_field, entity_type, end, start in fields(buf, entity_start, entity_end):
+            if entity_field != 3 or entity_type != LEN:
+                continue
+            trip_id = route_id = ""
+            stops = []
+            for update_field, update_type, value, pos in fields(buf, start, end):
+                if update_type != LEN:
+                    continue
+                if update_field == 1:
+                    trip_id, route_id = _trip(buf, pos, value)
+                elif update_field == 2:
+                    stop_id, arrival = _stop_time(buf, pos, value)
+                    if wanted is None or stop_id in wanted:
+                        stops.append((stop_id.decode(), arrival))
+            yield trip_id, route_id, stops